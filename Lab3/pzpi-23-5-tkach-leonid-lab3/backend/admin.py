@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from sqlalchemy.orm import Session
-from typing import List
-import database, models, services
+from typing import List, Optional
+from datetime import datetime
+import codecs
+import database, models, schemas, services, backup, retention, forecasts, metrics, profiler
 
 router = APIRouter(
     prefix="/api/admin",
@@ -17,32 +19,169 @@ def get_db():
         db.close()
 
 
-@router.post("/backup")
+@router.post("/backup", status_code=202)
 def backup_database():
     """
     Адміністративна функція: Створити резервну копію бази даних.
+    Копія створюється у фоні; статус можна перевірити за job_id.
     """
-    return services.create_database_backup()
+    return backup.start_backup()
+
+
+@router.get("/backup")
+def list_backup_jobs():
+    """
+    Список завдань резервного копіювання.
+    """
+    return backup.list_jobs()
+
+
+@router.get("/backup/{job_id}")
+def backup_status(job_id: str):
+    """
+    Статус завдання резервного копіювання.
+    """
+    job = backup.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backup job not found")
+    return job
+
+
+def stream_sensor_data_csv(plant_id: Optional[int], start: Optional[datetime], end: Optional[datetime]):
+    # The stream outlives the request dependencies, so it owns its session
+    db = database.SessionLocal()
+    try:
+        yield from services.iter_sensor_data_csv(db, plant_id, start, end)
+    finally:
+        db.close()
 
 
 @router.get("/export/sensor-data")
-def export_data(db: Session = Depends(get_db)):
+def export_data(
+    plant_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    gzip: bool = False
+):
     """
-    Експорт всіх даних сенсорів у CSV форматі.
+    Потоковий експорт даних сенсорів у CSV форматі.
+    Підтримує фільтри за рослиною та часом (from/to) і стиснення gzip.
     """
-    csv_data = services.export_sensor_data_csv(db)
-    return Response(content=csv_data, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=sensor_data.csv"})
+    content = stream_sensor_data_csv(plant_id, start, end)
+    if gzip:
+        return StreamingResponse(
+            services.gzip_chunks(content),
+            media_type="application/gzip",
+            headers={"Content-Disposition": "attachment; filename=sensor_data.csv.gz"}
+        )
+    return StreamingResponse(content, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=sensor_data.csv"})
 
 
 @router.post("/import/sensor-data")
-async def import_data(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def import_data(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
     Імпорт даних з CSV файлу в базу даних.
+    Файл читається потоково і записується пакетами; колонка timestamp зберігається.
+    Повертає звіт з номерами рядків, які не вдалося імпортувати, і рядком, на якому імпорт
+    зупинився через некоректне кодування (записані до нього пакети зберігаються).
+    """
+    # Lines are decoded as they are read; TextIOWrapper can't wrap the upload's
+    # SpooledTemporaryFile before Python 3.11
+    csv_file = codecs.iterdecode(file.file, "utf-8")
+    return services.import_sensor_data_csv(db, csv_file)
+
+
+@router.get("/retention")
+def retention_status(db: Session = Depends(get_db)):
+    """
+    Стан політик зберігання даних та метрики останнього очищення.
+    """
+    global_policy = retention.get_global_policy(db)
+    return {
+        "global": {"raw_days": global_policy.raw_days, "minute_rollup_days": global_policy.minute_rollup_days},
+        "policies": [schemas.RetentionPolicyResponse.model_validate(p) for p in retention.list_policies(db)],
+        "metrics": retention.metrics()
+    }
+
+
+@router.put("/retention/policies", response_model=schemas.RetentionPolicyResponse)
+def set_retention_policy(policy: schemas.RetentionPolicyUpdate, db: Session = Depends(get_db)):
+    """
+    Встановити політику зберігання: для рослини (plant_id) або глобальну (plant_id = null).
+    Сирі показники старші за raw_days видаляються, погодинні та денні агрегати залишаються.
+    """
+    return retention.set_policy(db, policy.plant_id, policy.raw_days, policy.minute_rollup_days)
+
+
+@router.post("/retention/run", status_code=202)
+def run_retention():
+    """
+    Запустити очищення застарілих даних у фоні.
+    """
+    return retention.run_in_background()
+
+
+@router.get("/forecasts")
+def forecast_refresh_status():
+    """
+    Стан фонового перерахунку прогнозів вологості.
+    """
+    return forecasts.metrics()
+
+
+@router.post("/forecasts/refresh", status_code=202)
+def refresh_forecasts():
+    """
+    Перерахувати стан прогнозу всіх рослин з повної історії (у пулі процесів, у фоні).
+    """
+    return forecasts.run_in_background()
+
+
+@router.get("/metrics/queries")
+def query_metrics(limit: int = Query(50, ge=1, le=500), route: Optional[str] = None):
+    """
+    SQL-запити з найбільшим сумарним часом виконання, з маршрутом, з якого вони виконувались.
+    """
+    return {
+        "slow_query_ms": metrics.SLOW_QUERY_MS,
+        "dropped": metrics.statement_stats.dropped,
+        "statements": metrics.statement_stats.top(limit, route)
+    }
+
+
+@router.delete("/metrics/queries", status_code=204)
+def reset_query_metrics():
+    """
+    Очистити статистику SQL-запитів.
+    """
+    metrics.statement_stats.reset()
+
+
+@router.post("/profiler/start")
+def start_profiler(interval_ms: float = Query(profiler.PROFILER_INTERVAL_MS, ge=1, le=1000)):
+    """
+    Увімкнути семплюючий профайлер (попередні семпли скидаються).
+    """
+    if not profiler.profiler.start(interval_ms):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return profiler.profiler.status()
+
+
+@router.post("/profiler/stop")
+def stop_profiler():
+    """
+    Зупинити профайлер; зібрані семпли доступні через GET /profiler.
+    """
+    profiler.profiler.stop()
+    return profiler.profiler.status()
+
+
+@router.get("/profiler", response_class=PlainTextResponse)
+def profiler_report(limit: Optional[int] = Query(None, ge=1)):
+    """
+    Семпли профайлера у форматі collapsed stacks (flamegraph.pl, speedscope).
     """
-    content = await file.read()
-    decoded_content = content.decode("utf-8")
-    result = services.import_sensor_data_csv(db, decoded_content)
-    return result
+    return profiler.profiler.collapsed(limit)
 
 
 @router.patch("/users/{user_id}/block")
@@ -0,0 +1,296 @@
+import os
+import json
+import queue
+import threading
+import logging
+import urllib.request
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import cache
+import database
+import models
+import schemas
+
+logger = logging.getLogger(__name__)
+
+# A threshold must be crossed by this many consecutive readings before an alert opens,
+# and cleared (with the hysteresis margin) by as many before it resolves
+ALERT_DEBOUNCE_READINGS = int(os.getenv("ALERT_DEBOUNCE_READINGS", "3"))
+ALERT_HYSTERESIS_MOISTURE = float(os.getenv("ALERT_HYSTERESIS_MOISTURE", "2"))
+ALERT_HYSTERESIS_TEMPERATURE = float(os.getenv("ALERT_HYSTERESIS_TEMPERATURE", "0.5"))
+ALERT_HYSTERESIS_LIGHT = float(os.getenv("ALERT_HYSTERESIS_LIGHT", "25"))
+# Light drops below min_light_level every night, so the light rule is opt-in
+ALERT_LIGHT_ENABLED = os.getenv("ALERT_LIGHT_ENABLED", "false").lower() in ("1", "true", "yes")
+# Optional push target: every state change is POSTed there as JSON
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+ALERT_WEBHOOK_TIMEOUT = float(os.getenv("ALERT_WEBHOOK_TIMEOUT", "5"))
+ALERT_WEBHOOK_QUEUE_SIZE = int(os.getenv("ALERT_WEBHOOK_QUEUE_SIZE", "1000"))
+
+LOW = "low"
+HIGH = "high"
+STATUS_OPEN = "open"
+STATUS_RESOLVED = "resolved"
+
+# (metric column, direction, settings field, hysteresis margin)
+RULES = (
+    ("soil_moisture", LOW, "min_moisture", ALERT_HYSTERESIS_MOISTURE),
+    ("soil_moisture", HIGH, "max_moisture", ALERT_HYSTERESIS_MOISTURE),
+    ("temperature", LOW, "min_temperature", ALERT_HYSTERESIS_TEMPERATURE),
+    ("temperature", HIGH, "max_temperature", ALERT_HYSTERESIS_TEMPERATURE),
+) + ((("light_level", LOW, "min_light_level", ALERT_HYSTERESIS_LIGHT),) if ALERT_LIGHT_ENABLED else ())
+
+
+def is_breach(kind: str, value: float, threshold: float) -> bool:
+    return value < threshold if kind == LOW else value > threshold
+
+
+def is_clear(kind: str, value: float, threshold: float, margin: float) -> bool:
+    return value >= threshold + margin if kind == LOW else value <= threshold - margin
+
+
+class _RuleState:
+    __slots__ = ("open", "breach_streak", "clear_streak")
+
+    def __init__(self, is_open: bool = False):
+        self.open = is_open
+        self.breach_streak = 0
+        self.clear_streak = 0
+
+
+class AlertEngine:
+    """
+    Checks ingested readings against the plant's settings and opens/resolves alerts.
+    The debounce counters live in memory. Whether an alert is open is the database's call:
+    it is re-read on every ingest, and an event is only emitted when this process's
+    INSERT/UPDATE actually changed the row, so several workers never announce the same change.
+    """
+
+    def __init__(self, debounce: int):
+        self.debounce = max(1, debounce)
+        self._lock = threading.Lock()
+        self._states = {}
+        self.evaluated = 0
+        self.opened = 0
+        self.resolved = 0
+        self.superseded = 0
+
+    def _thresholds(self, db: Session, plant_id: int):
+        settings = cache.plant_settings_cache.get(plant_id)
+        if settings is None:
+            db_settings = db.query(models.PlantSettings).filter(models.PlantSettings.plant_id == plant_id).first()
+            if db_settings is None:
+                # Same defaults the settings endpoint would create
+                return schemas.PlantSettingsBase()
+            settings = schemas.PlantSettingsResponse.model_validate(db_settings)
+            cache.plant_settings_cache.set(plant_id, settings)
+        return settings
+
+    def _sync_open_alerts(self, db: Session, plant_ids: set):
+        """
+        Aligns the in-memory open flags with the database, where other processes
+        (workers, the telemetry listener) may have opened or resolved alerts.
+        """
+        open_keys = set(db.query(models.Alert.plant_id, models.Alert.metric, models.Alert.kind).filter(
+            models.Alert.plant_id.in_(plant_ids),
+            models.Alert.status == STATUS_OPEN
+        ).all())
+        with self._lock:
+            for plant_id in plant_ids:
+                for metric, kind, _, _ in RULES:
+                    key = (plant_id, metric, kind)
+                    is_open = key in open_keys
+                    state = self._states.get(key)
+                    if state is None:
+                        self._states[key] = _RuleState(is_open)
+                    elif state.open != is_open:
+                        state.open, state.breach_streak, state.clear_streak = is_open, 0, 0
+
+    def evaluate(self, db: Session, rows: list[dict]) -> list[dict]:
+        """
+        Runs the rules over newly ingested rows (in the caller's transaction) and writes the
+        resulting alert changes. Returns the state-change events, to be published after commit.
+        """
+        if not rows:
+            return []
+        plant_ids = {row["plant_id"] for row in rows}
+        self._sync_open_alerts(db, plant_ids)
+        thresholds = {plant_id: self._thresholds(db, plant_id) for plant_id in plant_ids}
+
+        events = []
+        with self._lock:
+            for row in rows:
+                settings = thresholds[row["plant_id"]]
+                for metric, kind, field, margin in RULES:
+                    event = self._apply_rule(row, metric, kind, float(getattr(settings, field)), margin)
+                    if event:
+                        events.append(event)
+            self.evaluated += len(rows)
+
+        applied = []
+        for event in events:
+            if event["event"] == "alert.opened":
+                changed = self._insert_alert(db, event)
+            else:
+                changed = db.query(models.Alert).filter(
+                    models.Alert.plant_id == event["plant_id"],
+                    models.Alert.metric == event["metric"],
+                    models.Alert.kind == event["kind"],
+                    models.Alert.status == STATUS_OPEN
+                ).update({
+                    "status": STATUS_RESOLVED,
+                    "resolved_value": event["value"],
+                    "resolved_at": event["timestamp"]
+                }, synchronize_session=False)
+            # 0 rows: another process already made this change and announced it
+            if changed:
+                applied.append(event)
+        with self._lock:
+            self.opened += sum(1 for event in applied if event["event"] == "alert.opened")
+            self.resolved += sum(1 for event in applied if event["event"] == "alert.resolved")
+            self.superseded += len(events) - len(applied)
+        return applied
+
+    def _apply_rule(self, row: dict, metric: str, kind: str, threshold: float, margin: float):
+        key = (row["plant_id"], metric, kind)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _RuleState()
+        value = float(row[metric])
+
+        if not state.open:
+            state.breach_streak = state.breach_streak + 1 if is_breach(kind, value, threshold) else 0
+            if state.breach_streak < self.debounce:
+                return None
+            state.open, state.breach_streak, state.clear_streak = True, 0, 0
+            name = "alert.opened"
+        else:
+            state.clear_streak = state.clear_streak + 1 if is_clear(kind, value, threshold, margin) else 0
+            if state.clear_streak < self.debounce:
+                return None
+            state.open, state.breach_streak, state.clear_streak = False, 0, 0
+            name = "alert.resolved"
+
+        return {
+            "event": name,
+            "plant_id": row["plant_id"],
+            "metric": metric,
+            "kind": kind,
+            "threshold": threshold,
+            "value": value,
+            "timestamp": row["timestamp"]
+        }
+
+    def _insert_alert(self, db: Session, event: dict) -> int:
+        table = models.Alert.__table__
+        # Another worker process may have opened the same alert already
+        stmt = database.dialect_insert(db, table).values(
+            plant_id=event["plant_id"],
+            metric=event["metric"],
+            kind=event["kind"],
+            status=STATUS_OPEN,
+            threshold=event["threshold"],
+            value=event["value"],
+            opened_at=event["timestamp"]
+        ).on_conflict_do_nothing(
+            index_elements=["plant_id", "metric", "kind"],
+            index_where=text("status = 'open'")
+        )
+        return db.execute(stmt).rowcount
+
+    def forget(self, plant_ids):
+        """
+        Drops the in-memory state of these plants, e.g. after a rolled back ingest.
+        """
+        with self._lock:
+            for key in [key for key in self._states if key[0] in plant_ids]:
+                del self._states[key]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "evaluated": self.evaluated,
+                "opened": self.opened,
+                "resolved": self.resolved,
+                "superseded": self.superseded,
+                "tracked_plants": len({key[0] for key in self._states}),
+                "listeners": len(_listeners)
+            }
+
+
+engine = AlertEngine(ALERT_DEBOUNCE_READINGS)
+
+_listeners = []
+
+
+def add_listener(listener):
+    """
+    Registers a callable that receives every list of committed alert events.
+    Listeners run on the ingesting thread and must not block.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def publish(events: list[dict]):
+    for listener in list(_listeners):
+        try:
+            listener(events)
+        except Exception:
+            logger.exception("Alert listener %r failed", listener)
+
+
+class WebhookNotifier:
+    """
+    Delivers alert events to ALERT_WEBHOOK_URL from a background thread, so a slow receiver
+    never holds up ingest. Events are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, url: str, maxsize: int):
+        self.url = url
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="alert-webhook", daemon=True)
+        self._thread.start()
+
+    def __call__(self, events: list[dict]):
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            body = json.dumps(event, default=_json_default).encode("utf-8")
+            request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(request, timeout=ALERT_WEBHOOK_TIMEOUT).close()
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Alert webhook delivery failed: %s", e)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+if ALERT_WEBHOOK_URL:
+    add_listener(WebhookNotifier(ALERT_WEBHOOK_URL, ALERT_WEBHOOK_QUEUE_SIZE))
+
+
+def list_alerts(db: Session, plant_id: int, status: str = STATUS_OPEN, limit: int = 100) -> list[models.Alert]:
+    query = db.query(models.Alert).filter(models.Alert.plant_id == plant_id)
+    if status != "all":
+        query = query.filter(models.Alert.status == status)
+    return query.order_by(models.Alert.opened_at.desc()).limit(limit).all()
@@ -0,0 +1,193 @@
+import os
+import math
+import threading
+from array import array
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+import models
+
+# Readings per plant and metric the rolling mean/std are computed over
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "48"))
+# Nothing is flagged until the window holds this many readings (after a restart too)
+ANOMALY_MIN_READINGS = int(os.getenv("ANOMALY_MIN_READINGS", "20"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+
+# (metric column, lower bound of the std): an almost constant signal would otherwise turn
+# every sensor step into a huge z-score
+METRICS = (
+    ("soil_moisture", float(os.getenv("ANOMALY_MIN_STD_MOISTURE", "2"))),
+    ("temperature", float(os.getenv("ANOMALY_MIN_STD_TEMPERATURE", "0.5"))),
+    ("light_level", float(os.getenv("ANOMALY_MIN_STD_LIGHT", "25"))),
+)
+
+
+class RingWindow:
+    """
+    Fixed-size array of the latest values with running sum and sum of squares: O(1) per value.
+    The sums are recomputed from the array once per full turn, so float error can't build up.
+    """
+    __slots__ = ("values", "size", "index", "count", "total", "total_sq", "pushes")
+
+    def __init__(self, size: int):
+        self.values = array("d", bytes(8 * size))
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.pushes = 0
+
+    def push(self, value: float):
+        if self.count == self.size:
+            old = self.values[self.index]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.total_sq += value * value
+        self.index = (self.index + 1) % self.size
+        self.pushes += 1
+        if self.pushes % self.size == 0:
+            self.total = math.fsum(self.values[:self.count])
+            self.total_sq = math.fsum(v * v for v in self.values[:self.count])
+
+    def mean_std(self) -> tuple[float, float]:
+        mean = self.total / self.count
+        return mean, math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0))
+
+
+class AnomalyDetector:
+    """
+    Flags readings that lie more than ANOMALY_Z_THRESHOLD standard deviations from the rolling
+    mean of the plant's recent readings. Windows live only in memory and are filled from the
+    ingest stream, so detection never reads history from the database.
+    """
+
+    def __init__(self, window: int, min_readings: int, threshold: float):
+        self.window = max(2, window)
+        self.min_readings = max(2, min(min_readings, self.window))
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._windows = {}
+        self.evaluated = 0
+        self.flagged = 0
+
+    def detect(self, rows: list[dict]) -> list[dict]:
+        """
+        Feeds the rows (in order) through the windows and returns the anomaly rows to store.
+        """
+        found = []
+        with self._lock:
+            for row in rows:
+                for metric, min_std in METRICS:
+                    key = (row["plant_id"], metric)
+                    window = self._windows.get(key)
+                    if window is None:
+                        window = self._windows[key] = RingWindow(self.window)
+                    value = float(row[metric])
+                    if window.count >= self.min_readings:
+                        mean, std = window.mean_std()
+                        z_score = (value - mean) / max(std, min_std)
+                        if abs(z_score) >= self.threshold:
+                            found.append({
+                                "plant_id": row["plant_id"],
+                                "metric": metric,
+                                "value": value,
+                                "mean": round(mean, 3),
+                                "std": round(std, 3),
+                                "z_score": round(z_score, 3),
+                                "detected_at": row["timestamp"]
+                            })
+                    # Anomalies enter the window too, so a lasting level change stops being flagged
+                    window.push(value)
+            self.evaluated += len(rows)
+            self.flagged += len(found)
+        return found
+
+    def evaluate(self, db: Session, rows: list[dict]) -> list[dict]:
+        """
+        Runs detection over newly ingested rows and writes the anomalies in the caller's transaction.
+        """
+        found = self.detect(rows)
+        if found:
+            db.execute(models.Anomaly.__table__.insert(), found)
+        return found
+
+    def forget(self, plant_ids):
+        """
+        Drops the windows of these plants, e.g. after a rolled back ingest.
+        """
+        with self._lock:
+            for key in [key for key in self._windows if key[0] in plant_ids]:
+                del self._windows[key]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "evaluated": self.evaluated,
+                "flagged": self.flagged,
+                "windows": len(self._windows)
+            }
+
+
+detector = AnomalyDetector(ANOMALY_WINDOW, ANOMALY_MIN_READINGS, ANOMALY_Z_THRESHOLD)
+
+
+def rescan_plant(db: Session, plant_id: int) -> int:
+    """
+    Replaces the plant's anomalies with the ones found by a fresh detector over its stored history.
+    For data written without going through ingest (seeding, restores); not used on the ingest path.
+    """
+    scanner = AnomalyDetector(ANOMALY_WINDOW, ANOMALY_MIN_READINGS, ANOMALY_Z_THRESHOLD)
+    db.query(models.Anomaly).filter(models.Anomaly.plant_id == plant_id).delete(synchronize_session=False)
+
+    readings = db.query(
+        models.SensorData.plant_id, models.SensorData.soil_moisture, models.SensorData.temperature,
+        models.SensorData.light_level, models.SensorData.timestamp
+    ).filter(models.SensorData.plant_id == plant_id).order_by(
+        models.SensorData.timestamp.asc(), models.SensorData.sensor_data_id.asc()
+    ).yield_per(1000)
+
+    found = []
+    batch = []
+    for row in readings:
+        batch.append(row._asdict())
+        if len(batch) >= 1000:
+            found.extend(scanner.detect(batch))
+            batch = []
+    found.extend(scanner.detect(batch))
+    if found:
+        db.execute(models.Anomaly.__table__.insert(), found)
+    db.commit()
+    return len(found)
+
+
+def list_anomalies(db: Session, plant_id: int, metric: str = None, start: datetime = None,
+                   end: datetime = None, limit: int = 100) -> list[models.Anomaly]:
+    query = db.query(models.Anomaly).filter(models.Anomaly.plant_id == plant_id)
+    if metric:
+        query = query.filter(models.Anomaly.metric == metric)
+    if start is not None:
+        query = query.filter(models.Anomaly.detected_at >= start)
+    if end is not None:
+        query = query.filter(models.Anomaly.detected_at < end)
+    return query.order_by(models.Anomaly.detected_at.desc()).limit(limit).all()
+
+
+if __name__ == "__main__":
+    import sys
+    import database
+
+    models.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    try:
+        plant_ids = [int(arg) for arg in sys.argv[1:]] or [
+            row[0] for row in session.query(models.Plant.plant_id).order_by(models.Plant.plant_id)
+        ]
+        for plant_id in plant_ids:
+            print(f"Plant {plant_id}: {rescan_plant(session, plant_id)} anomalies")
+    finally:
+        session.close()
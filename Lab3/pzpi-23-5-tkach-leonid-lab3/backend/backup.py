@@ -0,0 +1,187 @@
+import os
+import csv
+import glob
+import gzip
+import io
+import shlex
+import shutil
+import sqlite3
+import subprocess
+import threading
+import uuid
+import zipfile
+import logging
+from datetime import datetime
+from sqlalchemy.engine import URL
+
+import database
+import models
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_RETENTION = int(os.getenv("BACKUP_RETENTION", "10"))
+# Jobs kept for GET /api/admin/backup/{job_id}; older ones are forgotten
+BACKUP_JOB_HISTORY = int(os.getenv("BACKUP_JOB_HISTORY", "50"))
+# Postgres: {url} (without the password, which is passed in PGPASSWORD) and {file} are substituted;
+# falls back to a table-by-table CSV dump if the binary is missing
+BACKUP_PG_DUMP_COMMAND = os.getenv("BACKUP_PG_DUMP_COMMAND", "pg_dump --format=custom --dbname={url} --file={file}")
+
+_jobs = {}
+_lock = threading.Lock()
+
+
+def _update(job_id: str, **fields):
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def get_job(job_id: str):
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def list_jobs() -> list[dict]:
+    with _lock:
+        return [dict(job) for job in _jobs.values()]
+
+
+def _forget_finished_jobs():
+    """
+    Drops the oldest finished jobs, leaving room for a new one within BACKUP_JOB_HISTORY.
+    Called with _lock held.
+    """
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("success", "error")]
+    for job_id in finished[:max(len(finished) - BACKUP_JOB_HISTORY + 1, 0)]:
+        del _jobs[job_id]
+
+
+def start_backup() -> dict:
+    """
+    Starts a backup in a background thread and returns its job.
+    If a backup is already running, that job is returned instead of starting another one.
+    """
+    with _lock:
+        for job in _jobs.values():
+            if job["status"] in ("queued", "running"):
+                return dict(job)
+
+        _forget_finished_jobs()
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "progress": 0.0,
+            "file": None,
+            "size_bytes": None,
+            "message": None,
+            "started_at": datetime.utcnow(),
+            "finished_at": None
+        }
+
+    threading.Thread(target=_run, args=(job_id,), name=f"backup-{job_id[:8]}", daemon=True).start()
+    return get_job(job_id)
+
+
+def _run(job_id: str):
+    _update(job_id, status="running")
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+
+    try:
+        if database.engine.dialect.name == "sqlite":
+            destination = _backup_sqlite(job_id, os.path.join(BACKUP_DIR, f"backup_{timestamp}.db.gz"))
+        else:
+            destination = _backup_postgres(job_id, os.path.join(BACKUP_DIR, f"backup_{timestamp}"))
+        _rotate()
+        _update(
+            job_id,
+            status="success",
+            progress=1.0,
+            file=destination,
+            size_bytes=os.path.getsize(destination),
+            finished_at=datetime.utcnow()
+        )
+    except Exception as e:
+        logger.exception("Backup %s failed", job_id)
+        _update(job_id, status="error", message=str(e), finished_at=datetime.utcnow())
+
+
+def _backup_sqlite(job_id: str, destination: str) -> str:
+    """
+    Consistent snapshot through the SQLite online backup API, then gzipped.
+    The database is copied in a single step: a step-by-step copy restarts whenever another
+    connection writes, so under steady ingest it would never finish. In WAL mode writers
+    keep going while the copy holds its read snapshot.
+    """
+    raw_copy = destination[:-len(".gz")]
+
+    def progress(status, remaining, total):
+        if total:
+            _update(job_id, progress=round((total - remaining) / total * 0.9, 3))
+
+    source = sqlite3.connect(database.engine.url.database)
+    target = sqlite3.connect(raw_copy)
+    try:
+        source.backup(target, pages=-1, progress=progress)
+    finally:
+        target.close()
+        source.close()
+
+    with open(raw_copy, "rb") as src, gzip.open(destination, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(raw_copy)
+    return destination
+
+
+def _backup_postgres(job_id: str, base_name: str) -> str:
+    command = shlex.split(BACKUP_PG_DUMP_COMMAND)
+    if command and shutil.which(command[0]):
+        destination = f"{base_name}.dump"
+        # The password would be visible to anyone running ps if it were part of --dbname
+        source = database.engine.url
+        url = URL.create(
+            "postgresql", source.username, None, source.host, source.port, source.database, source.query
+        ).render_as_string(hide_password=False)
+        args = [arg.format(url=url, file=destination) for arg in command]
+        env = dict(os.environ)
+        if source.password:
+            env["PGPASSWORD"] = source.password
+        subprocess.run(args, check=True, capture_output=True, env=env)
+        return destination
+
+    return _backup_tables_csv(job_id, f"{base_name}.zip")
+
+
+def _backup_tables_csv(job_id: str, destination: str) -> str:
+    """
+    Local stand-in for pg_dump: every table is streamed to a compressed CSV member of a zip archive.
+    Runs in one REPEATABLE READ transaction, so all tables come from the same snapshot.
+    """
+    tables = models.Base.metadata.sorted_tables
+    with database.engine.connect().execution_options(isolation_level="REPEATABLE READ", stream_results=True) as conn, \
+            zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, table in enumerate(tables):
+            with archive.open(f"{table.name}.csv", "w") as member:
+                text = io.TextIOWrapper(member, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow([column.name for column in table.columns])
+                for partition in conn.execute(table.select()).partitions(5000):
+                    writer.writerows(partition)
+                text.flush()
+                text.detach()
+            _update(job_id, progress=round((index + 1) / len(tables), 3))
+    return destination
+
+
+def _rotate():
+    """
+    Keeps the BACKUP_RETENTION newest backups and deletes the rest.
+    """
+    files = sorted(glob.glob(os.path.join(BACKUP_DIR, "backup_*")), key=os.path.getmtime, reverse=True)
+    for path in files[BACKUP_RETENTION:]:
+        try:
+            os.remove(path)
+        except OSError:
+            logger.warning("Could not remove old backup %s", path)
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+import models
+import schemas
+import services
+
+THREADS = int(os.getenv("BENCH_THREADS", "16"))
+READINGS_PER_THREAD = int(os.getenv("BENCH_READINGS", "200"))
+
+
+def run(label: str, engine):
+    """
+    THREADS writers each store READINGS_PER_THREAD readings, one commit per reading,
+    the same pattern as concurrent POST /api/sensor/data requests.
+    """
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    plant = models.Plant(name="Bench", species="Bench")
+    db.add(plant)
+    db.commit()
+    plant_id = plant.plant_id
+    db.close()
+
+    errors = []
+    lock = threading.Lock()
+
+    def writer():
+        db = Session()
+        try:
+            for i in range(READINGS_PER_THREAD):
+                reading = schemas.SensorDataCreate(plant_id=plant_id, soil_moisture=50, temperature=22.5, light_level=400)
+                try:
+                    services.save_sensor_reading(db, reading)
+                except Exception as e:
+                    db.rollback()
+                    with lock:
+                        errors.append(str(getattr(e, "orig", e)))
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = THREADS * READINGS_PER_THREAD
+    stored = total - len(errors)
+    print(f"{label:>10}: {stored}/{total} stored in {elapsed:.2f}s "
+          f"({stored / elapsed:.0f} readings/s), {len(errors)} errors")
+    if errors:
+        print(f"{'':>12}first error: {errors[0]}")
+    engine.dispose()
+
+
+def main():
+    url = os.getenv("BENCH_DATABASE_URL")
+    if url:
+        # Postgres (or any server database): compare default pool settings with the configured ones
+        run("default", create_engine(url))
+        run("configured", database.create_configured_engine(url))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        default_url = f"sqlite:///{os.path.join(tmp, 'default.db')}"
+        tuned_url = f"sqlite:///{os.path.join(tmp, 'tuned.db')}"
+        run("default", create_engine(default_url, connect_args={"check_same_thread": False}))
+        run("configured", database.create_configured_engine(tuned_url))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
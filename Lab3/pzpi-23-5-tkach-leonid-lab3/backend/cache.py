@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PLANT_CACHE_TTL = float(os.getenv("PLANT_CACHE_TTL", "60"))
+PLANT_CACHE_SIZE = int(os.getenv("PLANT_CACHE_SIZE", "10000"))
+HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "300"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Process-local LRU cache with per-entry expiry.
+    Safe to share between the threadpool workers that run sync route handlers.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+# plant_id -> bool
+plant_exists_cache = TTLCache(PLANT_CACHE_SIZE, PLANT_CACHE_TTL)
+# plant_id -> schemas.PlantSettingsResponse
+plant_settings_cache = TTLCache(PLANT_CACHE_SIZE, PLANT_CACHE_TTL)
+# period_days -> fleet health report; only expires, a few minutes of staleness is acceptable
+fleet_health_cache = TTLCache(32, HEALTH_CACHE_TTL)
+
+
+def invalidate_plant(plant_id: int):
+    plant_exists_cache.invalidate(plant_id)
+    plant_settings_cache.invalidate(plant_id)
@@ -0,0 +1,69 @@
+import json
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Response formats of the fast path:
+#   json     - array of objects, the same body as the default path
+#   columns  - {"columns": [...], "data": {column: [values]}}, keys are not repeated per row
+#   msgpack  - the columns layout as MessagePack
+FORMAT_JSON = "json"
+FORMAT_COLUMNS = "columns"
+FORMAT_MSGPACK = "msgpack"
+FORMATS = (FORMAT_JSON, FORMAT_COLUMNS, FORMAT_MSGPACK)
+
+MEDIA_TYPES = {
+    FORMAT_JSON: "application/json",
+    FORMAT_COLUMNS: "application/json",
+    FORMAT_MSGPACK: "application/msgpack",
+}
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """
+    JSON bytes via orjson when installed, the stdlib encoder otherwise.
+    Naive datetimes come out as isoformat() in both, like in Pydantic responses.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def to_columns(columns: tuple, rows: list) -> dict:
+    return {"columns": list(columns), "data": {column: [row[i] for row in rows] for i, column in enumerate(columns)}}
+
+
+def encode_rows(columns: tuple, rows: list, fmt: str) -> tuple[bytes, str]:
+    """
+    Encodes plain result tuples without building a model per row. Returns (body, media type).
+    Raises UnsupportedFormat if the format's library is not installed.
+    """
+    if fmt == FORMAT_JSON:
+        body = dumps([dict(zip(columns, row)) for row in rows])
+    elif fmt == FORMAT_COLUMNS:
+        body = dumps(to_columns(columns, rows))
+    elif fmt == FORMAT_MSGPACK:
+        if msgpack is None:
+            raise UnsupportedFormat("msgpack is not installed on the server")
+        body = msgpack.packb(to_columns(columns, rows), default=_json_default)
+    else:
+        raise UnsupportedFormat(f"Unknown format {fmt}")
+    return body, MEDIA_TYPES[fmt]
@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+import database
+import models
+import services
+import response_cache
+import rollups
+
+logger = logging.getLogger(__name__)
+
+# Background refresh is off unless an interval is set
+FORECAST_REFRESH_INTERVAL_MINUTES = int(os.getenv("FORECAST_REFRESH_INTERVAL_MINUTES", "0"))
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+# Plants per pool task: one history query per chunk, results are written chunk by chunk
+FORECAST_CHUNK_PLANTS = int(os.getenv("FORECAST_CHUNK_PLANTS", "50"))
+# Longest wait for in-flight ingest transactions when taking the cutoff (Postgres)
+FORECAST_CUTOFF_LOCK_TIMEOUT_MS = int(os.getenv("FORECAST_CUTOFF_LOCK_TIMEOUT_MS", "5000"))
+
+STATE_FIELDS = (
+    "reading_count", "ewma_stable", "ewma_volatile", "moisture_mean", "moisture_m2",
+    "last_moisture", "last_temperature", "updated_at"
+)
+
+_lock = threading.Lock()
+_run_lock = threading.Lock()
+_stop = threading.Event()
+_thread = None
+_metrics = {
+    "running": False,
+    "runs": 0,
+    "last_started_at": None,
+    "last_finished_at": None,
+    "last_duration_ms": 0.0,
+    "last_error": None,
+    "workers": 0,
+    "chunks_done": 0,
+    "plants_refreshed": 0,
+    "plants_skipped_pruned": 0,
+}
+
+
+def _set(**fields):
+    with _lock:
+        _metrics.update(fields)
+
+
+def _add(name: str, value: int):
+    with _lock:
+        _metrics[name] += value
+
+
+def metrics() -> dict:
+    with _lock:
+        return dict(_metrics, scheduler_running=bool(_thread and _thread.is_alive()))
+
+
+def compute_states(plant_ids: list[int], cutoff_id: int) -> dict:
+    """
+    Forecast state of each plant from its history up to sensor_data_id `cutoff_id`.
+    Runs in a pool worker with its own connection; returns plain dicts (plant_id -> STATE_FIELDS).
+    """
+    db = database.SessionLocal()
+    try:
+        states = {}
+        readings = db.query(
+            models.SensorData.plant_id, models.SensorData.soil_moisture, models.SensorData.temperature
+        ).filter(
+            models.SensorData.plant_id.in_(plant_ids),
+            models.SensorData.sensor_data_id <= cutoff_id
+        ).order_by(
+            models.SensorData.plant_id, models.SensorData.timestamp.asc(), models.SensorData.sensor_data_id.asc()
+        ).yield_per(5000)
+
+        for plant_id, moisture, temperature in readings:
+            state = states.get(plant_id)
+            if state is None:
+                # Transient object, only used to run the same update as ingest
+                state = states[plant_id] = models.PlantForecastState(plant_id=plant_id)
+            services.apply_reading_to_forecast_state(state, moisture, temperature)
+        return {plant_id: {field: getattr(state, field) for field in STATE_FIELDS} for plant_id, state in states.items()}
+    finally:
+        db.close()
+
+
+def _empty_state() -> dict:
+    return {
+        "reading_count": 0, "ewma_stable": None, "ewma_volatile": None, "moisture_mean": 0.0, "moisture_m2": 0.0,
+        "last_moisture": None, "last_temperature": None, "updated_at": datetime.utcnow()
+    }
+
+
+def store_states(db: Session, plant_ids: list[int], computed: dict, cutoff_id: int):
+    """
+    Replaces the forecast state of the plants. Readings ingested after the snapshot were
+    applied to the old state meanwhile, so they are replayed on the new one under the same row lock.
+    Plants without readings up to the cutoff start from an empty state; a state that stays
+    empty is deleted rather than left over from earlier data.
+    """
+    if not plant_ids:
+        return
+    plant_ids = sorted(plant_ids)
+    db.execute(
+        database.dialect_insert(db, models.PlantForecastState.__table__).on_conflict_do_nothing(index_elements=["plant_id"]),
+        [{"plant_id": plant_id, "reading_count": 0} for plant_id in plant_ids]
+    )
+    states = {
+        state.plant_id: state
+        for state in db.query(models.PlantForecastState)
+        .filter(models.PlantForecastState.plant_id.in_(plant_ids))
+        .order_by(models.PlantForecastState.plant_id)
+        .with_for_update()
+        .populate_existing()
+    }
+    for plant_id in plant_ids:
+        for field, value in computed.get(plant_id, _empty_state()).items():
+            setattr(states[plant_id], field, value)
+
+    newer = db.query(
+        models.SensorData.plant_id, models.SensorData.soil_moisture, models.SensorData.temperature
+    ).filter(
+        models.SensorData.plant_id.in_(plant_ids),
+        models.SensorData.sensor_data_id > cutoff_id
+    ).order_by(models.SensorData.sensor_data_id.asc())
+    for plant_id, moisture, temperature in newer:
+        services.apply_reading_to_forecast_state(states[plant_id], moisture, temperature)
+    for state in states.values():
+        if not state.reading_count:
+            db.delete(state)
+    db.commit()
+    response_cache.bump_plants(plant_ids)
+
+
+def snapshot_cutoff(db: Session) -> int:
+    """
+    Highest sensor_data_id such that every row up to it is committed, so the workers see all
+    of them and store_states only has to replay ids above it.
+    On Postgres ids come from a sequence and a transaction holding a lower id may commit after
+    a higher one: max(id) alone would let such a row escape both the workers and the replay.
+    SHARE mode waits for the in-flight inserting transactions to finish and holds back new
+    inserts only until the max is read. SQLite has a single writer whose uncommitted rows
+    always get ids above the committed ones.
+    """
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text(f"SET LOCAL lock_timeout = {int(FORECAST_CUTOFF_LOCK_TIMEOUT_MS)}"))
+        db.execute(text("LOCK TABLE sensor_data IN SHARE MODE"))
+    cutoff_id = db.query(func.max(models.SensorData.sensor_data_id)).scalar() or 0
+    # End the snapshot transaction, so writers are not held up while the pool works
+    db.rollback()
+    return cutoff_id
+
+
+def _chunks(plant_ids: list[int], size: int) -> list[list[int]]:
+    size = max(1, size)
+    return [plant_ids[i:i + size] for i in range(0, len(plant_ids), size)]
+
+
+def refresh_forecasts(plant_ids: list[int] = None) -> dict:
+    """
+    Recomputes the forecast state of the given plants (all by default) from their full history,
+    spreading chunks of plants over a process pool. Corrects state left behind by out-of-order or
+    restored history and builds it for plants that never had one.
+    Plants whose raw history was pruned by retention are skipped: their running state covers
+    readings that no longer exist, and the rollups can't rebuild the EWMA and variance.
+    Only one refresh runs at a time; a concurrent call returns the current metrics.
+    """
+    if not _run_lock.acquire(blocking=False):
+        return metrics()
+
+    started = time.perf_counter()
+    db = database.SessionLocal()
+    try:
+        _set(
+            running=True, last_started_at=datetime.utcnow(), last_error=None,
+            chunks_done=0, plants_refreshed=0, plants_skipped_pruned=0
+        )
+        if not plant_ids:
+            plant_ids = [row[0] for row in db.query(models.Plant.plant_id).order_by(models.Plant.plant_id)]
+        pruned = set(rollups.pruned_plants(db, plant_ids))
+        plant_ids = [plant_id for plant_id in plant_ids if plant_id not in pruned]
+        _set(plants_skipped_pruned=len(pruned))
+        cutoff_id = snapshot_cutoff(db)
+
+        chunks = _chunks(plant_ids, FORECAST_CHUNK_PLANTS)
+        workers = min(FORECAST_WORKERS, len(chunks))
+        _set(workers=workers)
+
+        if workers <= 1:
+            for chunk in chunks:
+                if _stop.is_set():
+                    break
+                _store_chunk(db, chunk, compute_states(chunk, cutoff_id), cutoff_id)
+        else:
+            # spawn: workers open their own connections instead of inheriting the parent's pool
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {pool.submit(compute_states, chunk, cutoff_id): chunk for chunk in chunks}
+                for future in as_completed(futures):
+                    if _stop.is_set():
+                        pool.shutdown(cancel_futures=True)
+                        break
+                    _store_chunk(db, futures[future], future.result(), cutoff_id)
+    except Exception as e:
+        db.rollback()
+        logger.exception("Forecast refresh failed")
+        _set(last_error=str(e))
+    finally:
+        db.close()
+        _set(
+            running=False, last_finished_at=datetime.utcnow(),
+            last_duration_ms=round((time.perf_counter() - started) * 1000, 3)
+        )
+        with _lock:
+            _metrics["runs"] += 1
+        _run_lock.release()
+    return metrics()
+
+
+def _store_chunk(db: Session, plant_ids: list[int], computed: dict, cutoff_id: int):
+    store_states(db, plant_ids, computed, cutoff_id)
+    _add("chunks_done", 1)
+    _add("plants_refreshed", len(plant_ids))
+
+
+def run_in_background() -> dict:
+    threading.Thread(target=refresh_forecasts, name="forecast-refresh", daemon=True).start()
+    return metrics()
+
+
+def _scheduler():
+    while not _stop.wait(FORECAST_REFRESH_INTERVAL_MINUTES * 60):
+        refresh_forecasts()
+
+
+def start_scheduler():
+    global _thread
+    if FORECAST_REFRESH_INTERVAL_MINUTES <= 0 or (_thread and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_scheduler, name="forecast-scheduler", daemon=True)
+    _thread.start()
+
+
+def stop_scheduler():
+    _stop.set()
+    if _thread:
+        _thread.join(timeout=10)
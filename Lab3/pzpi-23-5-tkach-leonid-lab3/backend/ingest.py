@@ -0,0 +1,359 @@
+import os
+import json
+import queue
+import threading
+import time
+import logging
+from datetime import datetime
+from sqlalchemy.exc import DataError, IntegrityError
+
+import database
+import models
+import schemas
+import services
+
+logger = logging.getLogger(__name__)
+
+# Opt-in write-behind mode for POST /api/sensor/data
+INGEST_BUFFERED = os.getenv("INGEST_BUFFERED", "false").lower() in ("1", "true", "yes")
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "200"))
+# SQLite serializes writers anyway, so one writer thread is the sensible default
+INGEST_WRITERS = int(os.getenv("INGEST_WRITERS", "1"))
+# A failed group write is retried with doubling pauses; after the last attempt (or on shutdown)
+# the rows go to the spool file and are written again once the database accepts writes
+INGEST_RETRY_ATTEMPTS = int(os.getenv("INGEST_RETRY_ATTEMPTS", "5"))
+INGEST_RETRY_BACKOFF_MS = int(os.getenv("INGEST_RETRY_BACKOFF_MS", "200"))
+INGEST_RETRY_MAX_BACKOFF_MS = int(os.getenv("INGEST_RETRY_MAX_BACKOFF_MS", "5000"))
+INGEST_SPOOL_PATH = os.getenv("INGEST_SPOOL_PATH", "ingest_spool.jsonl")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue of sensor readings drained by background writer threads.
+    Each writer commits a group of rows once INGEST_BATCH_SIZE rows are collected
+    or INGEST_FLUSH_INTERVAL_MS has passed since the first row of the group.
+
+    Queued readings have already been acknowledged with 202, so a group is never dropped
+    because the write failed: it is retried, and spooled to disk if the database stays
+    unavailable. Only rows the database rejects as invalid are dropped (and counted).
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, flush_interval_ms: int, writers: int,
+                 retry_attempts: int, retry_backoff_ms: int, retry_max_backoff_ms: int, spool_path: str):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.writers = writers
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff_ms / 1000.0
+        self.retry_max_backoff = retry_max_backoff_ms / 1000.0
+        self.spool_path = spool_path
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._replaying = False
+        self.enqueued = 0
+        self.rejected = 0
+        self.written = 0
+        self.retries = 0
+        self.dropped_invalid = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.spool_corrupt = 0
+        self.lost = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"ingest-writer-{i}", daemon=True)
+            for i in range(self.writers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stops the writers after the queue has been fully flushed.
+        Rows still queued when the writers don't finish in time are spooled.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+        leftover = []
+        while True:
+            try:
+                leftover.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._spool(leftover)
+
+    def put(self, reading: schemas.SensorDataCreate):
+        row = services.build_sensor_data_row(reading)
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError()
+        with self._lock:
+            self.enqueued += 1
+
+    def _collect(self) -> list[dict]:
+        rows = []
+        try:
+            rows.append(self.queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return rows
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def _flush(self, rows: list[dict]) -> bool:
+        """
+        Writes a group, retrying with backoff. Returns False if the rows had to be spooled.
+        """
+        started = time.perf_counter()
+        delay = self.retry_backoff
+        attempt = 0
+        while True:
+            try:
+                written = self._write(rows)
+                break
+            except Exception:
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                if attempt > self.retry_attempts or self._stop.is_set():
+                    logger.exception("Failed to write %d buffered readings, spooling them", len(rows))
+                    try:
+                        self._spool(rows)
+                    except OSError:
+                        logger.exception("Could not spool %d buffered readings, they are lost", len(rows))
+                        with self._lock:
+                            self.lost += len(rows)
+                    return False
+                logger.warning("Failed to write %d buffered readings (attempt %d), retrying in %.2fs",
+                               len(rows), attempt, delay, exc_info=True)
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.retry_max_backoff)
+
+        with self._lock:
+            self.written += written
+            self.flushes += 1
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+    def _write(self, rows: list[dict]) -> int:
+        """
+        Writes the rows; raises on errors worth retrying. Returns the number of rows written.
+        """
+        db = database.SessionLocal()
+        try:
+            try:
+                services.insert_sensor_data_rows(db, rows)
+                return len(rows)
+            except (IntegrityError, DataError):
+                # Something in the group is invalid (e.g. its plant was deleted after it was queued)
+                db.rollback()
+                return self._write_valid(db, rows)
+        finally:
+            db.close()
+
+    def _write_valid(self, db, rows: list[dict]) -> int:
+        plant_ids = {row["plant_id"] for row in rows}
+        known_ids = {r[0] for r in db.query(models.Plant.plant_id).filter(models.Plant.plant_id.in_(plant_ids))}
+        valid = [row for row in rows if row["plant_id"] in known_ids]
+        self._drop_invalid(len(rows) - len(valid), "of deleted plants")
+        try:
+            services.insert_sensor_data_rows(db, valid)
+            return len(valid)
+        except (IntegrityError, DataError):
+            db.rollback()
+
+        # Still rejected: write row by row so only the offending rows are lost
+        written = 0
+        for row in valid:
+            try:
+                services.insert_sensor_data_rows(db, [row])
+                written += 1
+            except (IntegrityError, DataError):
+                db.rollback()
+                self._drop_invalid(1, f"rejected by the database: {row}")
+        return written
+
+    def _drop_invalid(self, count: int, reason: str):
+        if count:
+            logger.error("Dropped %d buffered readings %s", count, reason)
+            with self._lock:
+                self.dropped_invalid += count
+
+    def _spool(self, rows: list[dict]):
+        with self._spool_lock:
+            # A write cut short (crash, full disk) leaves a partial last line; start on a new one
+            needs_newline = False
+            if os.path.exists(self.spool_path) and os.path.getsize(self.spool_path):
+                with open(self.spool_path, "rb") as spool:
+                    spool.seek(-1, os.SEEK_END)
+                    needs_newline = spool.read(1) != b"\n"
+            with open(self.spool_path, "a", encoding="utf-8") as spool:
+                if needs_newline:
+                    spool.write("\n")
+                for row in rows:
+                    spool.write(json.dumps({**row, "timestamp": row["timestamp"].isoformat()}) + "\n")
+        with self._lock:
+            self.spooled += len(rows)
+
+    def _replay_spool(self):
+        """
+        Writes spooled rows again, a batch at a time. The spool is moved aside first, so rows
+        that fail again are spooled anew instead of being read twice. The position after each
+        handled batch is saved, so a replay interrupted by a crash resumes there instead of
+        writing the earlier batches a second time. Lines that can't be decoded (a write cut
+        short) are moved to the .bad file and counted.
+        """
+        replay_path = self.spool_path + ".replay"
+        offset_path = self.spool_path + ".offset"
+        with self._spool_lock:
+            if self._replaying:
+                return
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spool_path) or os.path.getsize(self.spool_path) == 0:
+                    return
+                os.replace(self.spool_path, replay_path)
+            self._replaying = True
+
+        try:
+            offset = 0
+            if os.path.exists(offset_path):
+                with open(offset_path, encoding="utf-8") as f:
+                    offset = int(f.read().strip() or 0)
+            logger.info("Replaying spooled readings from %s (offset %d)", replay_path, offset)
+
+            with open(replay_path, "rb") as spool:
+                spool.seek(offset)
+                at_end = False
+                while not at_end:
+                    rows, at_end = self._read_spool_batch(spool)
+                    if rows and self._flush(rows):
+                        with self._lock:
+                            self.replayed += len(rows)
+                    self._save_offset(offset_path, spool.tell())
+
+            os.remove(replay_path)
+            os.remove(offset_path)
+        finally:
+            with self._spool_lock:
+                self._replaying = False
+
+    def _read_spool_batch(self, spool) -> tuple[list[dict], bool]:
+        """
+        Reads up to batch_size rows. Returns (rows, whether the end of the file was reached).
+        """
+        rows = []
+        while len(rows) < self.batch_size:
+            line = spool.readline()
+            if not line:
+                return rows, True
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+            except (ValueError, KeyError, TypeError):
+                self._quarantine(line)
+                continue
+            rows.append(row)
+        return rows, False
+
+    def _quarantine(self, line: bytes):
+        logger.error("Skipped an undecodable spool line, moved to %s.bad", self.spool_path)
+        with open(self.spool_path + ".bad", "ab") as bad:
+            bad.write(line if line.endswith(b"\n") else line + b"\n")
+        with self._lock:
+            self.spool_corrupt += 1
+
+    @staticmethod
+    def _save_offset(offset_path: str, offset: int):
+        temporary = offset_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+        os.replace(temporary, offset_path)
+
+    def _run(self):
+        try:
+            self._replay_spool()
+        except Exception:
+            logger.exception("Replaying the ingest spool failed, it is retried after the next write")
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                rows = self._collect()
+                if rows and self._flush(rows) and self._spool_pending():
+                    # The database is back: write what was spooled while it was not
+                    self._replay_spool()
+            except Exception:
+                # One bad batch or spool file must not stop the writer
+                logger.exception("Ingest writer error")
+                self._stop.wait(self.retry_backoff)
+
+    def _spool_pending(self) -> bool:
+        if os.path.exists(self.spool_path + ".replay"):
+            return True
+        return os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": INGEST_BUFFERED,
+                "running": self.running,
+                "queue_depth": self.queue.qsize(),
+                "queue_capacity": self.queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "dropped_invalid": self.dropped_invalid,
+                "spooled": self.spooled,
+                "replayed": self.replayed,
+                "spool_corrupt": self.spool_corrupt,
+                "lost": self.lost,
+                "flushes": self.flushes,
+                "last_flush_ms": self.last_flush_ms
+            }
+
+
+buffer = WriteBehindBuffer(
+    maxsize=INGEST_QUEUE_SIZE,
+    batch_size=INGEST_BATCH_SIZE,
+    flush_interval_ms=INGEST_FLUSH_INTERVAL_MS,
+    writers=INGEST_WRITERS,
+    retry_attempts=INGEST_RETRY_ATTEMPTS,
+    retry_backoff_ms=INGEST_RETRY_BACKOFF_MS,
+    retry_max_backoff_ms=INGEST_RETRY_MAX_BACKOFF_MS,
+    spool_path=INGEST_SPOOL_PATH
+)
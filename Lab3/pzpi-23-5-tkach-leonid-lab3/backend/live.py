@@ -0,0 +1,100 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+import database, services, pubsub
+
+router = APIRouter(
+    prefix="/api/plants",
+    tags=["Live"]
+)
+
+
+def plant_exists(plant_id: int) -> bool:
+    db = database.SessionLocal()
+    try:
+        return services.plant_exists(db, plant_id)
+    finally:
+        db.close()
+
+
+@router.get("/{plant_id}/live")
+async def stream_plant_events(plant_id: int, request: Request):
+    """
+    Потік подій рослини (Server-Sent Events): нові показники, сповіщення, оновлення прогнозу та здоров'я.
+    Замінює періодичне опитування /stats та /analytics/*.
+    """
+    if not await run_in_threadpool(plant_exists, plant_id):
+        raise HTTPException(status_code=404, detail="Plant not found")
+    if pubsub.broker.is_full():
+        raise HTTPException(status_code=503, detail="Too many live subscribers", headers={"Retry-After": "30"})
+
+    async def events():
+        # Subscribed only once the response is streaming: a client gone before that leaves nothing behind
+        try:
+            subscription = pubsub.broker.subscribe(plant_id)
+        except pubsub.TooManySubscribers:
+            yield "event: closed\ndata: too_many_subscribers\n\n"
+            return
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await subscription.get(pubsub.LIVE_HEARTBEAT_SECONDS)
+                except ConnectionAbortedError as e:
+                    # Too slow or server shutdown: the client reconnects and re-reads current state
+                    yield f"event: closed\ndata: {e}\n\n"
+                    return
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"data: {message}\n\n"
+        finally:
+            pubsub.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/{plant_id}/ws")
+async def plant_events_socket(websocket: WebSocket, plant_id: int):
+    """
+    Ті самі події, що й /live, через WebSocket.
+    """
+    if not await run_in_threadpool(plant_exists, plant_id):
+        await websocket.close(code=4404, reason="Plant not found")
+        return
+    try:
+        subscription = pubsub.broker.subscribe(plant_id)
+    except pubsub.TooManySubscribers:
+        await websocket.close(code=1013, reason="Too many live subscribers")
+        return
+
+    await websocket.accept()
+    # Clients only listen; a receive task notices when they go away
+    receiver = asyncio.ensure_future(_drain(websocket))
+    try:
+        while not receiver.done():
+            try:
+                message = await subscription.get(pubsub.LIVE_HEARTBEAT_SECONDS)
+            except ConnectionAbortedError as e:
+                await websocket.close(code=1008 if str(e) == "slow_consumer" else 1001, reason=str(e))
+                return
+            await websocket.send_text(message if message is not None else '{"type": "keepalive"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        pubsub.broker.unsubscribe(subscription)
+
+
+async def _drain(websocket: WebSocket):
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
@@ -1,8 +1,11 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
-import models, schemas, database, services, admin
+import models, schemas, database, services, admin, ingest, retention, middleware, metrics, profiler, cache, alerts, live, pubsub, response_cache, forecasts, encoders, telemetry_listener, anomalies
 
 models.Base.metadata.create_all(bind=database.engine)
 
@@ -12,7 +15,51 @@ app = FastAPI(
     version="1.1.0"
 )
 
+app.add_middleware(middleware.GzipRequestMiddleware)
+app.add_middleware(middleware.MetricsMiddleware)
+app.add_exception_handler(RequestValidationError, middleware.validation_error_handler)
+
+metrics.instrument_engine(database.engine)
+metrics.register_collector("ingest", ingest.buffer.metrics)
+metrics.register_collector("plant_exists_cache", cache.plant_exists_cache.stats)
+metrics.register_collector("plant_settings_cache", cache.plant_settings_cache.stats)
+metrics.register_collector("fleet_health_cache", cache.fleet_health_cache.stats)
+metrics.register_collector("alerts", alerts.engine.metrics)
+metrics.register_collector("anomalies", anomalies.detector.metrics)
+metrics.register_collector("live", pubsub.broker.metrics)
+metrics.register_collector("response_cache", response_cache.backend.stats)
+metrics.register_collector("forecast_refresh", forecasts.metrics)
+metrics.register_collector("telemetry", telemetry_listener.listener.metrics)
+
 app.include_router(admin.router)
+app.include_router(live.router)
+
+@app.on_event("startup")
+def start_background_workers():
+    if ingest.INGEST_BUFFERED:
+        ingest.buffer.start()
+    retention.start_scheduler()
+    forecasts.start_scheduler()
+    pubsub.start_refresher()
+    if profiler.PROFILER_ENABLED:
+        profiler.profiler.start()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    profiler.profiler.stop()
+    pubsub.stop_refresher()
+    forecasts.stop_scheduler()
+    retention.stop_scheduler()
+    ingest.buffer.stop()
+
+@app.on_event("startup")
+async def start_telemetry_listener():
+    # Binary TCP/UDP telemetry (TELEMETRY_TCP_PORT / TELEMETRY_UDP_PORT), served on the app's event loop
+    await telemetry_listener.listener.start()
+
+@app.on_event("shutdown")
+async def stop_telemetry_listener():
+    await telemetry_listener.listener.stop()
 
 def get_db():
     db = database.SessionLocal()
@@ -21,6 +68,13 @@ def get_db():
     finally:
         db.close()
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """
+    Метрики у текстовому форматі Prometheus.
+    """
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Smart Plant Care API"}
@@ -30,95 +84,184 @@ def receive_sensor_data(data: schemas.SensorDataCreate, db: Session = Depends(ge
     """
     Прийом телеметрії від IoT-пристрою (ESP32).
     Зберігає вологість, температуру та освітлення в БД.
+    У режимі INGEST_BUFFERED показник ставиться в чергу і записується групою (202 Accepted).
     """
-    plant = db.query(models.Plant).filter(models.Plant.plant_id == data.plant_id).first()
-    if not plant:
+    if not services.plant_exists(db, data.plant_id):
         raise HTTPException(status_code=404, detail="Plant not found")
-    
-    db_sensor_data = models.SensorData(
-        plant_id=data.plant_id,
-        soil_moisture=data.soil_moisture,
-        temperature=data.temperature,
-        light_level=data.light_level
-    )
-    db.add(db_sensor_data)
-    db.commit()
-    db.refresh(db_sensor_data)
-    return db_sensor_data
+
+    if ingest.INGEST_BUFFERED:
+        try:
+            ingest.buffer.put(data)
+        except ingest.QueueFullError:
+            raise HTTPException(status_code=429, detail="Ingest queue is full, retry later", headers={"Retry-After": "1"})
+        return JSONResponse(status_code=202, content={"status": "queued", "plant_id": data.plant_id})
+
+    return services.save_sensor_reading(db, data)
+
+@app.post("/api/sensor/data/batch", response_model=schemas.SensorDataBatchResponse, tags=["IoT"])
+def receive_sensor_data_batch(batch: schemas.SensorDataBatchCreate, db: Session = Depends(get_db)):
+    """
+    Пакетний прийом телеметрії від шлюзів (до MAX_BATCH_SIZE показників за запит).
+    Всі показники зберігаються однією транзакцією, помилки повертаються для кожного рядка.
+    """
+    return services.ingest_sensor_data_batch(db, batch.readings)
+
+@app.get("/api/sensor/ingest/metrics", tags=["IoT"])
+def read_ingest_metrics():
+    """
+    Стан черги буферизованого прийому телеметрії (глибина, записано, відхилено).
+    """
+    return ingest.buffer.metrics()
 
 @app.post("/api/plants", response_model=schemas.PlantResponse, tags=["Plants"])
 def create_plant(plant: schemas.PlantCreate, db: Session = Depends(get_db)):
-    db_plant = models.Plant(**plant.dict())
-    db.add(db_plant)
-    db.commit()
-    db.refresh(db_plant)
-    return db_plant
+    return services.create_plant(db, plant)
 
 @app.get("/api/plants", response_model=List[schemas.PlantResponse], tags=["Plants"])
-def read_plants(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    plants = db.query(models.Plant).offset(skip).limit(limit).all()
-    return plants
+def read_plants(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return response_cache.cached_response(
+        request, response_cache.PLANTS_SCOPE,
+        lambda: services.list_plants(db, skip, limit), List[schemas.PlantResponse]
+    )
+
+@app.get("/api/users/{user_id}/dashboard", response_model=schemas.UserDashboardResponse, tags=["Plants"])
+def read_user_dashboard(user_id: int, db: Session = Depends(get_db)):
+    """
+    Дашборд користувача одним запитом: усі рослини з налаштуваннями, останнім показником,
+    агрегатами за 24 години, прогнозом вологості та індексом здоров'я.
+    """
+    dashboard = services.get_user_dashboard(db, user_id)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return dashboard
 
 @app.get("/api/plants/{plant_id}/stats", response_model=List[schemas.SensorDataResponse], tags=["IoT"])
-def read_sensor_stats(plant_id: int, db: Session = Depends(get_db)):
+def read_sensor_stats(
+    plant_id: int,
+    response: Response,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(services.DEFAULT_HISTORY_LIMIT, ge=1, le=services.MAX_HISTORY_LIMIT),
+    cursor: Optional[str] = None,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(json|columns|msgpack)$"),
+    db: Session = Depends(get_db)
+):
     """
     Отримати історію показників для конкретної рослини.
+    Підтримує фільтр за часом (from/to) та посторінкову видачу: курсор наступної
+    сторінки повертається в заголовку X-Next-Cursor.
+    format=json|columns|msgpack — швидка видача без ORM-об'єктів: масив об'єктів,
+    колонковий JSON або колонковий MessagePack.
     """
-    readings = db.query(models.SensorData).filter(models.SensorData.plant_id == plant_id).all()
+    try:
+        if fmt:
+            rows, next_cursor = services.get_sensor_history_rows(db, plant_id, start, end, limit, cursor)
+        else:
+            readings, next_cursor = services.get_sensor_history(db, plant_id, start, end, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if fmt:
+        try:
+            body, media_type = encoders.encode_rows(services.HISTORY_COLUMNS, rows, fmt)
+        except encoders.UnsupportedFormat as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        return Response(content=body, media_type=media_type, headers=headers)
+    response.headers.update(headers)
     return readings
 
 @app.get("/api/plants/{plant_id}/settings", response_model=schemas.PlantSettingsResponse, tags=["Settings"])
-def read_plant_settings(plant_id: int, db: Session = Depends(get_db)):
+def read_plant_settings(plant_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Отримати поточні налаштування (межі поливу, температури) для рослини.
     Якщо налаштувань немає — створюються дефолтні.
     """
-    settings = db.query(models.PlantSettings).filter(models.PlantSettings.plant_id == plant_id).first()
-    if not settings:
-        settings = models.PlantSettings(plant_id=plant_id)
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
-    return settings
+    return response_cache.cached_response(
+        request, response_cache.plant_scope(plant_id),
+        lambda: services.get_plant_settings(db, plant_id), schemas.PlantSettingsResponse
+    )
 
 @app.put("/api/plants/{plant_id}/settings", response_model=schemas.PlantSettingsResponse, tags=["Settings"])
 def update_plant_settings(plant_id: int, settings: schemas.PlantSettingsUpdate, db: Session = Depends(get_db)):
     """
     Оновити налаштування (наприклад, встановити нову мін. вологість).
     """
-    db_settings = db.query(models.PlantSettings).filter(models.PlantSettings.plant_id == plant_id).first()
-    if not db_settings:
-        db_settings = models.PlantSettings(plant_id=plant_id)
-        db.add(db_settings)
-    
-    for var, value in settings.dict(exclude_unset=True).items():
-        setattr(db_settings, var, value)
-    
-    db_settings.updated_at = datetime.utcnow()
-    db.add(db_settings)
-    db.commit()
-    db.refresh(db_settings)
-    return db_settings
+    return services.update_plant_settings(db, plant_id, settings)
+
+@app.get("/api/plants/{plant_id}/alerts", response_model=List[schemas.AlertResponse], tags=["Alerts"])
+def read_plant_alerts(
+    plant_id: int,
+    status: str = Query(alerts.STATUS_OPEN, pattern="^(open|resolved|all)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Сповіщення рослини: вихід показників за межі налаштувань (відкриті, закриті або всі).
+    Сповіщення формуються сервером під час прийому телеметрії.
+    """
+    if not services.plant_exists(db, plant_id):
+        raise HTTPException(status_code=404, detail="Plant not found")
+    return alerts.list_alerts(db, plant_id, status, limit)
+
+@app.get("/api/plants/{plant_id}/anomalies", response_model=List[schemas.AnomalyResponse], tags=["Alerts"])
+def read_plant_anomalies(
+    plant_id: int,
+    metric: Optional[str] = Query(None, pattern="^(soil_moisture|temperature|light_level)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Аномалії телеметрії рослини: показники, що різко відхиляються від ковзного середнього
+    останніх вимірів (z-оцінка). Виявляються під час прийому телеметрії, найновіші першими.
+    """
+    if not services.plant_exists(db, plant_id):
+        raise HTTPException(status_code=404, detail="Plant not found")
+    return anomalies.list_anomalies(db, plant_id, metric, start, end, limit)
 
 
 
 @app.get("/api/plants/{plant_id}/analytics/forecast", tags=["Analytics"])
-def get_moisture_forecast(plant_id: int, db: Session = Depends(get_db)):
+def get_moisture_forecast(plant_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Прогноз вологості (EWMA) з кліматичною корекцією.
     """
-    return services.forecast_moisture(db, plant_id)
+    return response_cache.cached_response(
+        request, response_cache.plant_scope(plant_id), lambda: services.forecast_moisture(db, plant_id)
+    )
+
+@app.get("/api/plants/{plant_id}/analytics/health", tags=["Analytics"])
+def get_plant_health(plant_id: int, request: Request, period_days: int = Query(7, ge=1, le=365), db: Session = Depends(get_db)):
+    """
+    Індекс здоров'я рослини за період (частка показників у межах налаштувань).
+    """
+    return response_cache.cached_response(
+        request, response_cache.plant_scope(plant_id),
+        lambda: services.calculate_plant_health_index(db, plant_id, period_days)
+    )
+
+@app.get("/api/analytics/health", tags=["Analytics"])
+def get_fleet_health(period_days: int = Query(7, ge=1, le=365), db: Session = Depends(get_db)):
+    """
+    Індекс здоров'я всіх рослин одним агрегуючим запитом (результат кешується).
+    """
+    return services.get_fleet_health(db, period_days)
 
 @app.get("/api/plants/{plant_id}/analytics/stats", tags=["Analytics"])
-def get_plant_stats(plant_id: int, db: Session = Depends(get_db)):
+def get_plant_stats(plant_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Середні показники за весь час.
     """
-    return services.get_average_stats_per_plant(db, plant_id)
+    return response_cache.cached_response(
+        request, response_cache.plant_scope(plant_id), lambda: services.get_average_stats_per_plant(db, plant_id)
+    )
 
 @app.get("/api/plants/{plant_id}/analytics/hourly", tags=["Analytics"])
-def get_hourly_stats(plant_id: int, db: Session = Depends(get_db)):
+def get_hourly_stats(plant_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Погодинна статистика температури (циркадні ритми).
     """
-    return services.get_hourly_sensor_data(db, plant_id)
\ No newline at end of file
+    return response_cache.cached_response(
+        request, response_cache.plant_scope(plant_id), lambda: services.get_hourly_sensor_data(db, plant_id)
+    )
\ No newline at end of file
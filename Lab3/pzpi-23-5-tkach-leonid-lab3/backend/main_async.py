@@ -0,0 +1,220 @@
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+
+import models, schemas, database, services, services_async, database_async, admin, ingest, retention, middleware, metrics, profiler, cache, alerts, live, pubsub, response_cache, forecasts, encoders, telemetry_listener, anomalies
+
+# Async variant of main.py: same routes on an async engine/session (aiosqlite / asyncpg).
+# Run with: uvicorn main_async:app
+app = FastAPI(
+    title="Smart Plant Care API (async)",
+    description="Backend API for IoT Plant Care System (Lab 2 + Lab 3), async database stack",
+    version="1.1.0"
+)
+
+app.add_middleware(middleware.GzipRequestMiddleware)
+app.add_middleware(middleware.MetricsMiddleware)
+app.add_exception_handler(RequestValidationError, middleware.validation_error_handler)
+
+# Admin routes use the sync engine, everything else the async one
+metrics.instrument_engine(database.engine)
+metrics.instrument_engine(database_async.async_engine.sync_engine)
+metrics.register_collector("ingest", ingest.buffer.metrics)
+metrics.register_collector("plant_exists_cache", cache.plant_exists_cache.stats)
+metrics.register_collector("plant_settings_cache", cache.plant_settings_cache.stats)
+metrics.register_collector("fleet_health_cache", cache.fleet_health_cache.stats)
+metrics.register_collector("alerts", alerts.engine.metrics)
+metrics.register_collector("anomalies", anomalies.detector.metrics)
+metrics.register_collector("live", pubsub.broker.metrics)
+metrics.register_collector("response_cache", response_cache.backend.stats)
+metrics.register_collector("forecast_refresh", forecasts.metrics)
+metrics.register_collector("telemetry", telemetry_listener.listener.metrics)
+
+# Admin routes (backup, import/export) stay on the sync session and run in the threadpool
+app.include_router(admin.router)
+app.include_router(live.router)
+
+async def get_db():
+    async with database_async.AsyncSessionLocal() as db:
+        yield db
+
+@app.on_event("startup")
+async def startup():
+    async with database_async.async_engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    if ingest.INGEST_BUFFERED:
+        ingest.buffer.start()
+    retention.start_scheduler()
+    forecasts.start_scheduler()
+    pubsub.start_refresher()
+    if profiler.PROFILER_ENABLED:
+        profiler.profiler.start()
+    await telemetry_listener.listener.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await telemetry_listener.listener.stop()
+    profiler.profiler.stop()
+    pubsub.stop_refresher()
+    forecasts.stop_scheduler()
+    retention.stop_scheduler()
+    ingest.buffer.stop()
+    await database_async.async_engine.dispose()
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    Метрики у текстовому форматі Prometheus.
+    """
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/")
+async def read_root():
+    return {"message": "Welcome to Smart Plant Care API"}
+
+@app.post("/api/sensor/data", response_model=schemas.SensorDataResponse, tags=["IoT"])
+async def receive_sensor_data(data: schemas.SensorDataCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Прийом телеметрії від IoT-пристрою (ESP32).
+    """
+    if not await services_async.plant_exists(db, data.plant_id):
+        raise HTTPException(status_code=404, detail="Plant not found")
+
+    if ingest.INGEST_BUFFERED:
+        try:
+            ingest.buffer.put(data)
+        except ingest.QueueFullError:
+            raise HTTPException(status_code=429, detail="Ingest queue is full, retry later", headers={"Retry-After": "1"})
+        return JSONResponse(status_code=202, content={"status": "queued", "plant_id": data.plant_id})
+
+    return await services_async.save_sensor_reading(db, data)
+
+@app.post("/api/sensor/data/batch", response_model=schemas.SensorDataBatchResponse, tags=["IoT"])
+async def receive_sensor_data_batch(batch: schemas.SensorDataBatchCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Пакетний прийом телеметрії від шлюзів.
+    """
+    return await services_async.ingest_sensor_data_batch(db, batch.readings)
+
+@app.get("/api/sensor/ingest/metrics", tags=["IoT"])
+async def read_ingest_metrics():
+    return ingest.buffer.metrics()
+
+@app.post("/api/plants", response_model=schemas.PlantResponse, tags=["Plants"])
+async def create_plant(plant: schemas.PlantCreate, db: AsyncSession = Depends(get_db)):
+    return await services_async.create_plant(db, plant)
+
+@app.get("/api/plants", response_model=List[schemas.PlantResponse], tags=["Plants"])
+async def read_plants(request: Request, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    return await response_cache.cached_response_async(
+        request, response_cache.PLANTS_SCOPE,
+        lambda: services_async.list_plants(db, skip, limit), List[schemas.PlantResponse]
+    )
+
+@app.get("/api/users/{user_id}/dashboard", response_model=schemas.UserDashboardResponse, tags=["Plants"])
+async def read_user_dashboard(user_id: int, db: AsyncSession = Depends(get_db)):
+    dashboard = await services_async.get_user_dashboard(db, user_id)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return dashboard
+
+@app.get("/api/plants/{plant_id}/stats", response_model=List[schemas.SensorDataResponse], tags=["IoT"])
+async def read_sensor_stats(
+    plant_id: int,
+    response: Response,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(services.DEFAULT_HISTORY_LIMIT, ge=1, le=services.MAX_HISTORY_LIMIT),
+    cursor: Optional[str] = None,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(json|columns|msgpack)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Історія показників рослини з посторінковою видачею (X-Next-Cursor).
+    format=json|columns|msgpack — швидка видача без ORM-об'єктів.
+    """
+    try:
+        if fmt:
+            rows, next_cursor = await services_async.get_sensor_history_rows(db, plant_id, start, end, limit, cursor)
+        else:
+            readings, next_cursor = await services_async.get_sensor_history(db, plant_id, start, end, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if fmt:
+        try:
+            # Large pages take milliseconds to encode, off the event loop
+            body, media_type = await run_in_threadpool(encoders.encode_rows, services.HISTORY_COLUMNS, rows, fmt)
+        except encoders.UnsupportedFormat as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        return Response(content=body, media_type=media_type, headers=headers)
+    response.headers.update(headers)
+    return readings
+
+@app.get("/api/plants/{plant_id}/settings", response_model=schemas.PlantSettingsResponse, tags=["Settings"])
+async def read_plant_settings(plant_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    return await response_cache.cached_response_async(
+        request, response_cache.plant_scope(plant_id),
+        lambda: services_async.get_plant_settings(db, plant_id), schemas.PlantSettingsResponse
+    )
+
+@app.put("/api/plants/{plant_id}/settings", response_model=schemas.PlantSettingsResponse, tags=["Settings"])
+async def update_plant_settings(plant_id: int, settings: schemas.PlantSettingsUpdate, db: AsyncSession = Depends(get_db)):
+    return await services_async.update_plant_settings(db, plant_id, settings)
+
+@app.get("/api/plants/{plant_id}/alerts", response_model=List[schemas.AlertResponse], tags=["Alerts"])
+async def read_plant_alerts(
+    plant_id: int,
+    status: str = Query(alerts.STATUS_OPEN, pattern="^(open|resolved|all)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    if not await services_async.plant_exists(db, plant_id):
+        raise HTTPException(status_code=404, detail="Plant not found")
+    return await services_async.list_alerts(db, plant_id, status, limit)
+
+@app.get("/api/plants/{plant_id}/anomalies", response_model=List[schemas.AnomalyResponse], tags=["Alerts"])
+async def read_plant_anomalies(
+    plant_id: int,
+    metric: Optional[str] = Query(None, pattern="^(soil_moisture|temperature|light_level)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    if not await services_async.plant_exists(db, plant_id):
+        raise HTTPException(status_code=404, detail="Plant not found")
+    return await services_async.list_anomalies(db, plant_id, metric, start, end, limit)
+
+@app.get("/api/plants/{plant_id}/analytics/forecast", tags=["Analytics"])
+async def get_moisture_forecast(plant_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    return await response_cache.cached_response_async(
+        request, response_cache.plant_scope(plant_id), lambda: services_async.forecast_moisture(db, plant_id)
+    )
+
+@app.get("/api/plants/{plant_id}/analytics/health", tags=["Analytics"])
+async def get_plant_health(plant_id: int, request: Request, period_days: int = Query(7, ge=1, le=365), db: AsyncSession = Depends(get_db)):
+    return await response_cache.cached_response_async(
+        request, response_cache.plant_scope(plant_id),
+        lambda: services_async.calculate_plant_health_index(db, plant_id, period_days)
+    )
+
+@app.get("/api/analytics/health", tags=["Analytics"])
+async def get_fleet_health(period_days: int = Query(7, ge=1, le=365), db: AsyncSession = Depends(get_db)):
+    return await services_async.get_fleet_health(db, period_days)
+
+@app.get("/api/plants/{plant_id}/analytics/stats", tags=["Analytics"])
+async def get_plant_stats(plant_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    return await response_cache.cached_response_async(
+        request, response_cache.plant_scope(plant_id), lambda: services_async.get_average_stats_per_plant(db, plant_id)
+    )
+
+@app.get("/api/plants/{plant_id}/analytics/hourly", tags=["Analytics"])
+async def get_hourly_stats(plant_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    return await response_cache.cached_response_async(
+        request, response_cache.plant_scope(plant_id), lambda: services_async.get_hourly_sensor_data(db, plant_id)
+    )
@@ -0,0 +1,263 @@
+import os
+import re
+import threading
+import time
+import logging
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Distinct (route, statement) pairs kept for the per-statement report
+METRICS_MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", "500"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Route template of the request being served, "background" for worker threads
+current_route = ContextVar("current_route", default="background")
+# Per-request counters ({"queries": n, "db_seconds": s}), shared with the threadpool thread running the handler
+current_request_stats = ContextVar("current_request_stats", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {bucket_count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being served.", ("route",))
+http_response_size = Histogram(
+    "http_response_size_bytes", "HTTP response body size.", ("method", "route"), SIZE_BUCKETS
+)
+http_request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request.", ("method", "route"), COUNT_BUCKETS
+)
+db_query_duration = Histogram("db_query_duration_seconds", "SQL statement latency.", ("route", "operation"))
+db_query_rows = Counter("db_query_rows_total", "Rows returned or affected, as reported by the driver.", ("route", "operation"))
+db_slow_queries = Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.", ("route",))
+
+REGISTRY = [
+    http_request_duration, http_requests_in_flight, http_response_size, http_request_db_queries,
+    db_query_duration, db_query_rows, db_slow_queries
+]
+
+# name -> callable returning a dict of numbers, rendered as gauges "<name>_<key>"
+_collectors = {}
+
+
+def register_collector(name: str, collect):
+    """
+    Exposes the numeric fields of a metrics dict (e.g. ingest.metrics) as gauges.
+    """
+    _collectors[name] = collect
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, collect in _collectors.items():
+        try:
+            values = collect()
+        except Exception:
+            logger.exception("Metrics collector %s failed", name)
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {name}_{key} gauge")
+                lines.append(f"{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class StatementStats:
+    """
+    Calls, total/max time and rows per (route, SQL statement): which queries make a route slow.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.dropped = 0
+
+    def record(self, route: str, statement: str, seconds: float, rows: int):
+        key = (route, statement)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self.dropped += 1
+                    return
+                entry = self._entries[key] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+            ms = seconds * 1000
+            entry["calls"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["rows"] += max(rows, 0)
+
+    def top(self, limit: int = 50, route: str = None) -> list[dict]:
+        with self._lock:
+            entries = [
+                {"route": key[0], "statement": key[1], **value,
+                 "total_ms": round(value["total_ms"], 3), "max_ms": round(value["max_ms"], 3),
+                 "avg_ms": round(value["total_ms"] / value["calls"], 3)}
+                for key, value in self._entries.items()
+                if route is None or key[0] == route
+            ]
+        entries.sort(key=lambda e: e["total_ms"], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.dropped = 0
+
+
+statement_stats = StatementStats(METRICS_MAX_STATEMENTS)
+
+_WHITESPACE = re.compile(r"\s+")
+# Parameter lists expand per call (IN lists, multi-row VALUES from batched inserts): one statement
+# per list size would fill the table, so each list collapses to "(...)" and repeated rows to one.
+# Placeholders of the DBAPI paramstyles, plus the integer sentinels of ordered multi-row inserts.
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+|-?\d+)(?:::\w+(?:\(\d+\))?)?"
+_PARAMETER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_REPEATED_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+
+
+def _normalize_statement(statement: str) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _PARAMETER_LIST.sub("(...)", statement)
+    return _REPEATED_ROWS.sub("(...)", statement)
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)
+    return word[0].upper() if word else "UNKNOWN"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    route = current_route.get()
+    operation = _operation(statement)
+    rows = getattr(cursor, "rowcount", -1)
+
+    db_query_duration.observe(elapsed, route, operation)
+    if rows > 0:
+        db_query_rows.inc(route, operation, amount=rows)
+    statement_stats.record(route, _normalize_statement(statement), elapsed, rows)
+
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats["queries"] += 1
+        stats["db_seconds"] += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(route)
+        logger.warning(
+            "Slow query (%.1f ms, %s rows) in %s: %s",
+            elapsed * 1000, rows, route, _WHITESPACE.sub(" ", statement).strip()[:1000]
+        )
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute, its start time is dropped here
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """
+    Attaches the query timing hooks to a (sync) engine; for an AsyncEngine pass engine.sync_engine.
+    """
+    if not METRICS_ENABLED or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
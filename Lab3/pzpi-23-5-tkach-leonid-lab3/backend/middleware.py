@@ -0,0 +1,148 @@
+import os
+import time
+import zlib
+
+from fastapi import Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+import metrics
+
+# Upper bound for a decompressed request body, against gzip bombs
+MAX_DECOMPRESSED_BODY = int(os.getenv("MAX_DECOMPRESSED_BODY", str(50 * 1024 * 1024)))
+
+
+class GzipRequestMiddleware:
+    """
+    Accepts request bodies sent with "Content-Encoding: gzip" (batched device uploads)
+    and passes them on decompressed, so route handlers see plain JSON.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if headers.get(b"content-encoding", b"").lower() != b"gzip":
+            return await self.app(scope, receive, send)
+
+        decompressor = zlib.decompressobj(wbits=31)
+        body = bytearray()
+        more_body = True
+        try:
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                chunk = message.get("body", b"")
+                body += decompressor.decompress(chunk, MAX_DECOMPRESSED_BODY + 1 - len(body))
+                if len(body) > MAX_DECOMPRESSED_BODY:
+                    return await _send_error(send, 413, b"Decompressed body too large")
+                more_body = message.get("more_body", False)
+            body += decompressor.flush()
+        except zlib.error:
+            return await _send_error(send, 400, b"Invalid gzip body")
+
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(body)).encode())]
+
+        sent = False
+
+        async def receive_decompressed():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": bytes(body), "more_body": False}
+
+        await self.app(scope, receive_decompressed, send)
+
+
+async def _send_error(send, status: int, detail: bytes):
+    body = b'{"detail": "' + detail + b'"}'
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    """
+    Answers an oversized batch (readings longer than schemas.MAX_BATCH_SIZE) with 413
+    instead of 422; other validation errors get FastAPI's default response.
+    """
+    for error in exc.errors():
+        if error["type"] == "too_long" and tuple(error["loc"]) == ("body", "readings"):
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Batch too large (max {error['ctx']['max_length']} readings)"}
+            )
+    return await request_validation_exception_handler(request, exc)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, in-flight requests, response size and SQL statement count per route template,
+    and makes the route known to the query hooks in metrics.py.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        route = _route_template(scope)
+        method = scope["method"]
+        route_token = metrics.current_route.set(route)
+        stats = {"queries": 0, "db_seconds": 0.0}
+        stats_token = metrics.current_request_stats.set(stats)
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.http_requests_in_flight.inc(route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            metrics.http_requests_in_flight.dec(route)
+            metrics.http_request_duration.observe(time.perf_counter() - started, method, route, str(status))
+            metrics.http_response_size.observe(size, method, route)
+            metrics.http_request_db_queries.observe(stats["queries"], method, route)
+            metrics.current_request_stats.reset(stats_token)
+            metrics.current_route.reset(route_token)
+
+
+def _route_template(scope) -> str:
+    """
+    "/api/plants/{plant_id}/stats" rather than the raw path, so label values stay bounded.
+    """
+    app = scope.get("app")
+    partial = None
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+        if match == Match.PARTIAL and partial is None:
+            # Path matches but the method does not (405)
+            partial = getattr(route, "path", None)
+    return partial or "unmatched"
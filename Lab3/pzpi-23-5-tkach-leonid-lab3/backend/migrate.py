@@ -0,0 +1,77 @@
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from database import engine
+import models
+
+
+def _index_sql(index, table_name: str, concurrently: bool = False, only: bool = False) -> str:
+    """
+    CREATE INDEX IF NOT EXISTS as SQLAlchemy compiles it for the dialect, so partial indexes keep
+    their WHERE predicate. `table_name` retargets it (a partition), `only` adds ON ONLY.
+    """
+    sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+    if concurrently:
+        sql = sql.replace(" INDEX IF NOT EXISTS ", " INDEX CONCURRENTLY IF NOT EXISTS ", 1)
+    target = f"ONLY {table_name}" if only else table_name
+    return sql.replace(f" ON {index.table.name} (", f" ON {target} (", 1)
+
+
+def _partitions(conn, table_name: str):
+    """
+    Partition names of a partitioned Postgres table, or None if the table is not partitioned.
+    """
+    partitioned = conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name"
+    ), {"name": table_name}).first()
+    if partitioned is None:
+        return None
+    return [row[0] for row in conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :name ORDER BY c.relname"
+    ), {"name": table_name})]
+
+
+def _ensure_postgres_index(index):
+    table_name = index.table.name
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        partitions = _partitions(conn, table_name)
+        if partitions is None:
+            conn.exec_driver_sql(_index_sql(index, table_name, concurrently=True))
+            return
+
+        # CONCURRENTLY is not allowed on a partitioned parent: create the parent index ON ONLY
+        # (no build), build each partition's index concurrently and attach it
+        conn.exec_driver_sql(_index_sql(index, table_name, only=True))
+        for partition in partitions:
+            partition_index = f"{partition}_{index.name}"[:63]
+            partition_sql = _index_sql(index, partition, concurrently=True).replace(
+                f" EXISTS {index.name} ON ", f" EXISTS {partition_index} ON ", 1
+            )
+            conn.exec_driver_sql(partition_sql)
+            # No-op when the partition's index is already attached
+            conn.exec_driver_sql(f"ALTER INDEX {index.name} ATTACH PARTITION {partition_index}")
+
+
+def ensure_indexes():
+    """
+    Creates tables and indexes declared in models that are missing from an existing database.
+    create_all() only creates missing tables, so indexes added to existing tables need this step.
+    On Postgres indexes are built CONCURRENTLY so ingest is not blocked while they build
+    (partition by partition on a partitioned table).
+    """
+    models.Base.metadata.create_all(bind=engine)
+
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if engine.dialect.name == "postgresql":
+                _ensure_postgres_index(index)
+            else:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql(_index_sql(index, table.name))
+            columns = ", ".join(column.name for column in index.columns)
+            print(f"Index {index.name} on {table.name}({columns}): ok")
+
+
+if __name__ == "__main__":
+    ensure_indexes()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -45,6 +45,10 @@ class PlantSettings(Base):
 
 class SensorData(Base):
     __tablename__ = "sensor_data"
+    __table_args__ = (
+        # Every history, stats and forecast query filters by plant and orders/filters by time
+        Index("ix_sensor_data_plant_id_timestamp", "plant_id", "timestamp"),
+    )
 
     sensor_data_id = Column(Integer, primary_key=True, index=True)
     plant_id = Column(Integer, ForeignKey("plants.plant_id"))
@@ -54,3 +58,89 @@ class SensorData(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     plant = relationship("Plant", back_populates="sensor_data")
+
+class PlantForecastState(Base):
+    __tablename__ = "plant_forecast_state"
+
+    plant_id = Column(Integer, ForeignKey("plants.plant_id"), primary_key=True)
+    reading_count = Column(Integer, default=0)
+    # Running EWMA for both candidate alphas, so the choice can be made at read time
+    ewma_stable = Column(Float)
+    ewma_volatile = Column(Float)
+    # Welford running mean / sum of squared deviations of soil moisture
+    moisture_mean = Column(Float, default=0.0)
+    moisture_m2 = Column(Float, default=0.0)
+    last_moisture = Column(Float)
+    last_temperature = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class SensorRollup(Base):
+    __tablename__ = "sensor_rollups"
+    __table_args__ = (
+        UniqueConstraint("plant_id", "bucket_size", "bucket_start", name="uq_sensor_rollups_bucket"),
+    )
+
+    rollup_id = Column(Integer, primary_key=True, index=True)
+    plant_id = Column(Integer, ForeignKey("plants.plant_id"), nullable=False)
+    bucket_size = Column(String, nullable=False)  # "minute" | "hour" | "day"
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, default=0)
+    moisture_sum = Column(Float, default=0.0)
+    moisture_min = Column(Float)
+    moisture_max = Column(Float)
+    temperature_sum = Column(Float, default=0.0)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    light_sum = Column(Float, default=0.0)
+    light_min = Column(Float)
+    light_max = Column(Float)
+
+class RetentionPolicy(Base):
+    __tablename__ = "retention_policies"
+
+    policy_id = Column(Integer, primary_key=True, index=True)
+    # NULL plant_id is the global policy
+    plant_id = Column(Integer, ForeignKey("plants.plant_id"), unique=True, nullable=True)
+    raw_days = Column(Integer, default=30)
+    minute_rollup_days = Column(Integer, default=7)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class Alert(Base):
+    __tablename__ = "alerts"
+    __table_args__ = (
+        # At most one open alert per plant, metric and direction
+        Index(
+            "ux_alerts_open", "plant_id", "metric", "kind", unique=True,
+            sqlite_where=text("status = 'open'"), postgresql_where=text("status = 'open'")
+        ),
+        Index("ix_alerts_plant_id_opened_at", "plant_id", "opened_at"),
+    )
+
+    alert_id = Column(Integer, primary_key=True, index=True)
+    plant_id = Column(Integer, ForeignKey("plants.plant_id"), nullable=False)
+    metric = Column(String, nullable=False)  # "soil_moisture" | "temperature" | "light_level"
+    kind = Column(String, nullable=False)  # "low" | "high"
+    status = Column(String, nullable=False, default="open")  # "open" | "resolved"
+    threshold = Column(Float)
+    value = Column(Float)
+    resolved_value = Column(Float)
+    # Timestamps of the readings that opened / resolved the alert
+    opened_at = Column(DateTime, nullable=False)
+    resolved_at = Column(DateTime)
+
+class Anomaly(Base):
+    __tablename__ = "anomalies"
+    __table_args__ = (
+        Index("ix_anomalies_plant_id_detected_at", "plant_id", "detected_at"),
+    )
+
+    anomaly_id = Column(Integer, primary_key=True, index=True)
+    plant_id = Column(Integer, ForeignKey("plants.plant_id"), nullable=False)
+    metric = Column(String, nullable=False)  # "soil_moisture" | "temperature" | "light_level"
+    value = Column(Float, nullable=False)
+    # Rolling window statistics the reading was compared with
+    mean = Column(Float)
+    std = Column(Float)
+    z_score = Column(Float)
+    # Timestamp of the flagged reading
+    detected_at = Column(DateTime, nullable=False)
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Start sampling at boot, e.g. for a load test; otherwise it is switched on through the admin API
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+PROFILER_MAX_DEPTH = int(os.getenv("PROFILER_MAX_DEPTH", "64"))
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a daemon thread snapshots the stacks of all other threads every interval
+    and counts them in collapsed-stack form ("outer;inner;leaf count"), ready for flamegraph.pl or speedscope.
+    Costs nothing while stopped; while running the overhead grows with the number of threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = Counter()
+        self.interval_ms = PROFILER_INTERVAL_MS
+        self.started_at = None
+        self.sample_count = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = None) -> bool:
+        with self._lock:
+            if self.running:
+                return False
+            self.interval_ms = interval_ms or PROFILER_INTERVAL_MS
+            self.samples = Counter()
+            self.sample_count = 0
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_ms / 1000):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                with self._lock:
+                    self.samples[";".join(reversed(stack))] += 1
+            with self._lock:
+                self.sample_count += 1
+
+    def collapsed(self, limit: int = None) -> str:
+        with self._lock:
+            stacks = self.samples.most_common(limit)
+        return "\n".join(f"{stack} {count}" for stack, count in stacks) + "\n"
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_ms": self.interval_ms,
+                "started_at": self.started_at,
+                "samples": self.sample_count,
+                "distinct_stacks": len(self.samples)
+            }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,247 @@
+import os
+import json
+import asyncio
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime
+
+import database
+import services
+import alerts
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per subscriber; a subscriber that falls this far behind is disconnected
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "10000"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+# Forecast/health of plants with subscribers and new readings are recomputed at most this often
+LIVE_ANALYTICS_INTERVAL = float(os.getenv("LIVE_ANALYTICS_INTERVAL", "10"))
+
+READING_FIELDS = ("sensor_data_id", "plant_id", "soil_moisture", "temperature", "light_level", "timestamp")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode(message_type: str, plant_id: int, data) -> str:
+    return json.dumps({"type": message_type, "plant_id": plant_id, "data": data}, default=_json_default)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """
+    One connected client. Messages are pushed from any thread and consumed by the client's
+    coroutine on the event loop it subscribed from.
+    """
+
+    def __init__(self, plant_id: int, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.plant_id = plant_id
+        self.loop = loop
+        self.maxsize = maxsize
+        self.closed_reason = None
+        self._messages = deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, message: str) -> bool:
+        """
+        Called with the broker lock held. Returns False if the subscriber is too slow and was closed.
+        """
+        if self.closed_reason:
+            return False
+        if len(self._messages) >= self.maxsize:
+            self.closed_reason = "slow_consumer"
+            self._wake()
+            return False
+        self._messages.append(message)
+        self._wake()
+        return True
+
+    def close(self, reason: str):
+        self.closed_reason = reason
+        self._wake()
+
+    def _wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Event loop already closed, the client is gone
+            pass
+
+    async def get(self, timeout: float):
+        """
+        Next message, or None after `timeout` seconds without one (time for a heartbeat).
+        Raises ConnectionAbortedError once the subscription was closed by the broker.
+        """
+        while True:
+            if self._messages:
+                return self._messages.popleft()
+            if self.closed_reason:
+                raise ConnectionAbortedError(self.closed_reason)
+            self._ready.clear()
+            # Re-check after clear: a message may have arrived in between
+            if self._messages or self.closed_reason:
+                continue
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+
+class Broker:
+    """
+    In-process publish/subscribe of per-plant telemetry. Each message is encoded once and shared
+    by all subscribers of the plant; publishing never blocks on a subscriber.
+    """
+
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._dirty_plants = set()
+        self.published = 0
+        self.delivered = 0
+        self.disconnected_slow = 0
+
+    def _is_full(self) -> bool:
+        return sum(len(subs) for subs in self._topics.values()) >= self.max_subscribers
+
+    def is_full(self) -> bool:
+        with self._lock:
+            return self._is_full()
+
+    def subscribe(self, plant_id: int) -> Subscription:
+        subscription = Subscription(plant_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if self._is_full():
+                raise TooManySubscribers()
+            self._topics.setdefault(plant_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.plant_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.plant_id]
+
+    def has_subscribers(self, plant_id: int) -> bool:
+        with self._lock:
+            return plant_id in self._topics
+
+    def publish(self, plant_id: int, message: str):
+        with self._lock:
+            subscribers = self._topics.get(plant_id)
+            if not subscribers:
+                return
+            self.published += 1
+            for subscription in list(subscribers):
+                if subscription.offer(message):
+                    self.delivered += 1
+                else:
+                    subscribers.discard(subscription)
+                    self.disconnected_slow += 1
+            if not subscribers:
+                del self._topics[plant_id]
+
+    def publish_readings(self, rows: list[dict]):
+        """
+        Pushes committed sensor_data rows to their plants' subscribers.
+        """
+        with self._lock:
+            if not self._topics:
+                return
+            watched = self._topics.keys() & {row["plant_id"] for row in rows}
+            self._dirty_plants.update(watched)
+        for row in rows:
+            if row["plant_id"] in watched:
+                data = {field: row[field] for field in READING_FIELDS if field in row}
+                self.publish(row["plant_id"], encode("reading", row["plant_id"], data))
+
+    def publish_alerts(self, events: list[dict]):
+        for event in events:
+            self.publish(event["plant_id"], encode("alert", event["plant_id"], event))
+
+    def take_dirty_plants(self) -> set:
+        with self._lock:
+            plants = self._dirty_plants & self._topics.keys()
+            self._dirty_plants = set()
+        return plants
+
+    def close_all(self, reason: str = "shutdown"):
+        with self._lock:
+            for subscribers in self._topics.values():
+                for subscription in subscribers:
+                    subscription.close(reason)
+            self._topics.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "topics": len(self._topics),
+                "subscribers": sum(len(subs) for subs in self._topics.values()),
+                "published": self.published,
+                "delivered": self.delivered,
+                "disconnected_slow": self.disconnected_slow
+            }
+
+
+broker = Broker(LIVE_QUEUE_SIZE, LIVE_MAX_SUBSCRIBERS)
+alerts.add_listener(broker.publish_alerts)
+services.add_ingest_listener(broker.publish_readings)
+
+
+def refresh_analytics(plant_ids: set):
+    """
+    Recomputes forecast and health of plants that received readings and pushes them to subscribers.
+    """
+    db = database.SessionLocal()
+    try:
+        for plant_id in plant_ids:
+            broker.publish(plant_id, encode("forecast", plant_id, services.forecast_moisture(db, plant_id)))
+            broker.publish(plant_id, encode("health", plant_id, services.calculate_plant_health_index(db, plant_id)))
+    finally:
+        db.close()
+
+
+_stop = threading.Event()
+_thread = None
+
+
+def _refresher_loop():
+    while not _stop.wait(LIVE_ANALYTICS_INTERVAL):
+        plant_ids = broker.take_dirty_plants()
+        if not plant_ids:
+            continue
+        started = time.perf_counter()
+        try:
+            refresh_analytics(plant_ids)
+        except Exception:
+            logger.exception("Live analytics refresh failed")
+        logger.debug("Live analytics for %d plants in %.1f ms", len(plant_ids), (time.perf_counter() - started) * 1000)
+
+
+def start_refresher():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_refresher_loop, name="live-analytics", daemon=True)
+    _thread.start()
+
+
+def stop_refresher():
+    _stop.set()
+    broker.close_all()
+    if _thread is not None:
+        _thread.join(5)
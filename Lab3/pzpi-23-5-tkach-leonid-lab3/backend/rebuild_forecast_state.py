@@ -0,0 +1,26 @@
+import sys
+from database import engine
+import models
+import forecasts
+
+models.Base.metadata.create_all(bind=engine)
+
+
+def rebuild(plant_ids: list[int]):
+    """
+    Recomputes plant_forecast_state from sensor history, in parallel over FORECAST_WORKERS processes.
+    Run once after upgrading an existing database, or after importing out-of-order history.
+    """
+    result = forecasts.refresh_forecasts(plant_ids)
+    if result["last_error"]:
+        print(f"Failed: {result['last_error']}")
+        return 1
+    print(
+        f"{result['plants_refreshed']} plants refreshed in {result['last_duration_ms'] / 1000:.1f}s "
+        f"({result['workers']} workers, {result['chunks_done']} chunks)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(rebuild([int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,28 @@
+import sys
+from database import SessionLocal, engine
+import models
+import rollups
+
+models.Base.metadata.create_all(bind=engine)
+
+
+def rebuild(plant_ids: list[int]):
+    """
+    Recomputes sensor_rollups (minute/hour/day) from raw sensor_data.
+    Plants with uncovered history are also rebuilt on their first analytics request;
+    this script does it up front, e.g. right after upgrading an existing database.
+    """
+    db = SessionLocal()
+    try:
+        if not plant_ids:
+            plant_ids = [row[0] for row in db.query(models.Plant.plant_id).order_by(models.Plant.plant_id)]
+
+        for plant_id in plant_ids:
+            count = rollups.rebuild_rollups(db, plant_id)
+            print(f"Plant {plant_id}: {count} readings")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild([int(arg) for arg in sys.argv[1:]])
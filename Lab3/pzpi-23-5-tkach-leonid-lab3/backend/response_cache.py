@@ -0,0 +1,154 @@
+import os
+import json
+import hashlib
+import threading
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import cache
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+# Upper bound on staleness when generations are process-local (several workers with the in-memory backend)
+# and for time-dependent results such as the 7-day health window
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+PLANTS_SCOPE = "plants"
+
+
+def plant_scope(plant_id: int) -> str:
+    return f"plant:{plant_id}"
+
+
+class InMemoryBackend:
+    """
+    Default backend: response bodies in a process-local LRU, generation counters in a dict.
+    A shared store (e.g. Redis GET/SETEX/INCR) only has to provide the same four methods.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = cache.TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self._generations = {}
+
+    def get(self, key: str):
+        return self._entries.get(key)
+
+    def set(self, key: str, entry: dict):
+        self._entries.set(key, entry)
+
+    def generation(self, scope: str) -> int:
+        with self._lock:
+            return self._generations.get(scope, 0)
+
+    def bump(self, scope: str):
+        with self._lock:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def stats(self) -> dict:
+        stats = self._entries.stats()
+        with self._lock:
+            stats["generations"] = len(self._generations)
+        return stats
+
+
+backend = InMemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+def set_backend(new_backend):
+    global backend
+    backend = new_backend
+
+
+def bump_plants(plant_ids):
+    """
+    Invalidates the cached responses of these plants; call after their data or settings were committed.
+    """
+    for plant_id in plant_ids:
+        backend.bump(plant_scope(plant_id))
+
+
+def bump_plant_list():
+    backend.bump(PLANTS_SCOPE)
+
+
+_adapters = {}
+
+
+def _serialize(content, model) -> bytes:
+    if model is None:
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = _adapters[model] = TypeAdapter(model)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def _not_modified(request: Request, entry: dict) -> bool:
+    # Only the content ETag is trusted. There is no Last-Modified: generations are per process
+    # and results such as the 7-day health window change with time alone, so a date derived
+    # from them could answer 304 for stale data indefinitely.
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or entry["etag"] in tags or f"W/{entry['etag']}" in tags
+
+
+def _lookup(request: Request, scope: str):
+    if not RESPONSE_CACHE_ENABLED:
+        return None, None
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    key = f"{request.url.path}?{query}#{backend.generation(scope)}"
+    return key, backend.get(key)
+
+
+def _entry(body: bytes) -> dict:
+    # Content hash, so every worker produces the same ETag for the same body
+    return {
+        "body": body,
+        "etag": '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    }
+
+
+def _response(request: Request, entry: dict, cache_status: str) -> Response:
+    headers = {
+        "ETag": entry["etag"],
+        # Clients may keep the body but must revalidate it on every use
+        "Cache-Control": "private, no-cache",
+        "X-Cache": cache_status
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
+def cached_response(request: Request, scope: str, compute, model=None) -> Response:
+    """
+    Serves a JSON response from the cache for the current generation of `scope`,
+    or computes, serializes and stores it. Answers conditional requests with 304.
+    `model` is the response type (e.g. List[schemas.PlantResponse]) used to serialize ORM results.
+    """
+    key, entry = _lookup(request, scope)
+    if entry is not None:
+        return _response(request, entry, "HIT")
+    entry = _entry(_serialize(compute(), model))
+    if RESPONSE_CACHE_ENABLED:
+        backend.set(key, entry)
+    return _response(request, entry, "MISS")
+
+
+async def cached_response_async(request: Request, scope: str, compute, model=None) -> Response:
+    """
+    cached_response for async routes: `compute` is a coroutine function.
+    """
+    key, entry = _lookup(request, scope)
+    if entry is not None:
+        return _response(request, entry, "HIT")
+    entry = _entry(_serialize(await compute(), model))
+    if RESPONSE_CACHE_ENABLED:
+        backend.set(key, entry)
+    return _response(request, entry, "MISS")
+
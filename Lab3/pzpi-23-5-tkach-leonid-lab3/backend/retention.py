@@ -0,0 +1,354 @@
+import os
+import re
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import database
+import models
+import rollups
+import response_cache
+
+logger = logging.getLogger(__name__)
+
+# Global defaults, used until a global policy row is stored
+RETENTION_RAW_DAYS = int(os.getenv("RETENTION_RAW_DAYS", "30"))
+RETENTION_MINUTE_ROLLUP_DAYS = int(os.getenv("RETENTION_MINUTE_ROLLUP_DAYS", "7"))
+# Background scheduler is off unless an interval is set
+RETENTION_INTERVAL_MINUTES = int(os.getenv("RETENTION_INTERVAL_MINUTES", "0"))
+RETENTION_DELETE_CHUNK = int(os.getenv("RETENTION_DELETE_CHUNK", "5000"))
+# Pause between delete chunks so ingest gets the write lock in between (SQLite)
+RETENTION_CHUNK_SLEEP = float(os.getenv("RETENTION_CHUNK_SLEEP", "0.05"))
+# Postgres: monthly partitions created ahead of time
+RETENTION_PARTITIONS_AHEAD = int(os.getenv("RETENTION_PARTITIONS_AHEAD", "2"))
+
+_PARTITION_NAME = re.compile(r"^sensor_data_y(\d{4})m(\d{2})$")
+
+_lock = threading.Lock()
+_run_lock = threading.Lock()
+_stop = threading.Event()
+_thread = None
+_metrics = {
+    "running": False,
+    "runs": 0,
+    "last_started_at": None,
+    "last_finished_at": None,
+    "last_error": None,
+    "current_plant_id": None,
+    "plants_processed": 0,
+    "raw_rows_deleted": 0,
+    "minute_rollups_deleted": 0,
+    "partitions_dropped": 0,
+    "total_raw_rows_deleted": 0,
+}
+
+
+def _set(**fields):
+    with _lock:
+        _metrics.update(fields)
+
+
+def _add(name: str, value: int):
+    with _lock:
+        _metrics[name] += value
+        if name == "raw_rows_deleted":
+            _metrics["total_raw_rows_deleted"] += value
+
+
+def metrics() -> dict:
+    with _lock:
+        return dict(_metrics, scheduler_running=bool(_thread and _thread.is_alive()))
+
+
+def day_cutoff(days: int, now: datetime = None) -> datetime:
+    """
+    Retention cutoffs are aligned to midnight, so the oldest remaining day of raw data is complete
+    and rollups rebuilt from raw data stay consistent with the ones kept.
+    """
+    now = now or datetime.utcnow()
+    return rollups.bucket_start(now - timedelta(days=days), rollups.BUCKET_DAY)
+
+
+# --- policies -------------------------------------------------------------------------------------
+
+def get_global_policy(db: Session) -> models.RetentionPolicy:
+    policy = db.query(models.RetentionPolicy).filter(models.RetentionPolicy.plant_id.is_(None)).first()
+    if policy is None:
+        policy = models.RetentionPolicy(
+            plant_id=None, raw_days=RETENTION_RAW_DAYS, minute_rollup_days=RETENTION_MINUTE_ROLLUP_DAYS
+        )
+    return policy
+
+
+def list_policies(db: Session) -> list[models.RetentionPolicy]:
+    return db.query(models.RetentionPolicy).order_by(models.RetentionPolicy.plant_id).all()
+
+
+def set_policy(db: Session, plant_id: int, raw_days: int, minute_rollup_days: int) -> models.RetentionPolicy:
+    query = db.query(models.RetentionPolicy)
+    if plant_id is None:
+        query = query.filter(models.RetentionPolicy.plant_id.is_(None))
+    else:
+        query = query.filter(models.RetentionPolicy.plant_id == plant_id)
+
+    policy = query.first()
+    if policy is None:
+        policy = models.RetentionPolicy(plant_id=plant_id)
+        db.add(policy)
+    policy.raw_days = raw_days
+    policy.minute_rollup_days = minute_rollup_days
+    policy.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(policy)
+    return policy
+
+
+def effective_policies(db: Session) -> dict:
+    """
+    plant_id -> (raw_days, minute_rollup_days) for every plant, per-plant policy over the global one.
+    """
+    default = get_global_policy(db)
+    overrides = {
+        p.plant_id: (p.raw_days, p.minute_rollup_days)
+        for p in db.query(models.RetentionPolicy).filter(models.RetentionPolicy.plant_id.isnot(None))
+    }
+    return {
+        plant_id: overrides.get(plant_id, (default.raw_days, default.minute_rollup_days))
+        for (plant_id,) in db.query(models.Plant.plant_id).order_by(models.Plant.plant_id)
+    }
+
+
+# --- chunked deletes ------------------------------------------------------------------------------
+
+def _delete_in_chunks(db: Session, model, id_column, conditions) -> int:
+    """
+    Deletes matching rows RETENTION_DELETE_CHUNK at a time, committing after every chunk,
+    so neither a long write lock (SQLite) nor a huge transaction (Postgres) builds up.
+    """
+    deleted = 0
+    while not _stop.is_set():
+        ids = [row[0] for row in db.query(id_column).filter(*conditions).limit(RETENTION_DELETE_CHUNK)]
+        if not ids:
+            break
+        db.query(model).filter(id_column.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < RETENTION_DELETE_CHUNK:
+            break
+        time.sleep(RETENTION_CHUNK_SLEEP)
+    return deleted
+
+
+def prune_plant(db: Session, plant_id: int, raw_days: int, minute_rollup_days: int, now: datetime = None) -> dict:
+    raw_cutoff = day_cutoff(raw_days, now)
+    minute_cutoff = day_cutoff(minute_rollup_days, now)
+
+    raw_deleted = _delete_in_chunks(db, models.SensorData, models.SensorData.sensor_data_id, (
+        models.SensorData.plant_id == plant_id,
+        models.SensorData.timestamp < raw_cutoff,
+    ))
+    minute_deleted = _delete_in_chunks(db, models.SensorRollup, models.SensorRollup.rollup_id, (
+        models.SensorRollup.plant_id == plant_id,
+        models.SensorRollup.bucket_size == rollups.BUCKET_MINUTE,
+        models.SensorRollup.bucket_start < minute_cutoff,
+    ))
+    if raw_deleted:
+        response_cache.bump_plants([plant_id])
+    return {"raw_rows_deleted": raw_deleted, "minute_rollups_deleted": minute_deleted}
+
+
+# --- Postgres range partitioning ------------------------------------------------------------------
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"sensor_data_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.bind.dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'sensor_data'"
+    )).first() is not None
+
+
+def _create_month_partition(db: Session, month: datetime):
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(month)} PARTITION OF sensor_data "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    ))
+
+
+def ensure_partitions(db: Session, now: datetime = None):
+    """
+    Creates the monthly partitions for the current month and RETENTION_PARTITIONS_AHEAD months after it.
+    """
+    month = _month_start(now or datetime.utcnow())
+    for _ in range(RETENTION_PARTITIONS_AHEAD + 1):
+        try:
+            _create_month_partition(db, month)
+            db.commit()
+        except Exception:
+            # e.g. rows for that month already landed in the default partition
+            db.rollback()
+            logger.warning("Could not create partition %s", _partition_name(month), exc_info=True)
+        month = _next_month(month)
+
+
+def drop_expired_partitions(db: Session, policies: dict, now: datetime = None) -> int:
+    """
+    Drops whole monthly partitions older than the longest raw retention of any plant:
+    far cheaper than deleting their rows, and gives the space back immediately.
+    """
+    if not policies:
+        return 0
+    cutoff = day_cutoff(max(raw_days for raw_days, _ in policies.values()), now)
+
+    partitions = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'sensor_data'"
+    )).scalars().all()
+
+    dropped = 0
+    for name in partitions:
+        match = _PARTITION_NAME.match(name)
+        if not match:
+            continue
+        month = datetime(int(match.group(1)), int(match.group(2)), 1)
+        if _next_month(month) <= cutoff:
+            db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+            dropped += 1
+    return dropped
+
+
+def convert_to_partitioned(db: Session):
+    """
+    One-off Postgres migration: turns sensor_data into a table range-partitioned by month on timestamp.
+    The primary key becomes (sensor_data_id, timestamp), as Postgres requires the partition key in it.
+    Rows are copied inside one transaction; run it in a maintenance window.
+    """
+    if db.bind.dialect.name != "postgresql":
+        raise RuntimeError("Native partitioning is only available on Postgres")
+    if is_partitioned(db):
+        return
+
+    first, = db.execute(text("SELECT min(timestamp) FROM sensor_data")).first()
+    sequence, = db.execute(text("SELECT pg_get_serial_sequence('sensor_data', 'sensor_data_id')")).first()
+
+    db.execute(text("ALTER TABLE sensor_data RENAME TO sensor_data_unpartitioned"))
+    db.execute(text(
+        "CREATE TABLE sensor_data (LIKE sensor_data_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+    ))
+    db.execute(text("ALTER TABLE sensor_data ADD CONSTRAINT sensor_data_partitioned_pkey PRIMARY KEY (sensor_data_id, timestamp)"))
+    db.execute(text("ALTER TABLE sensor_data ADD FOREIGN KEY (plant_id) REFERENCES plants (plant_id)"))
+
+    month = _month_start(first or datetime.utcnow())
+    last = _month_start(datetime.utcnow())
+    while month <= last:
+        _create_month_partition(db, month)
+        month = _next_month(month)
+    db.execute(text("CREATE TABLE IF NOT EXISTS sensor_data_default PARTITION OF sensor_data DEFAULT"))
+
+    db.execute(text("INSERT INTO sensor_data SELECT * FROM sensor_data_unpartitioned"))
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY sensor_data.sensor_data_id"))
+    db.execute(text("DROP TABLE sensor_data_unpartitioned"))
+    db.execute(text("CREATE INDEX ix_sensor_data_plant_id_timestamp ON sensor_data (plant_id, timestamp)"))
+    db.execute(text("CREATE INDEX ix_sensor_data_sensor_data_id ON sensor_data (sensor_data_id)"))
+    db.commit()
+    ensure_partitions(db)
+
+
+# --- runs and scheduler ---------------------------------------------------------------------------
+
+def run_retention(now: datetime = None) -> dict:
+    """
+    One retention pass over all plants. Returns the metrics of the pass.
+    Concurrent calls are skipped while a pass is already running.
+    """
+    if not _run_lock.acquire(blocking=False):
+        return metrics()
+
+    db = database.SessionLocal()
+    try:
+        _set(
+            running=True, last_started_at=datetime.utcnow(), last_error=None, plants_processed=0,
+            raw_rows_deleted=0, minute_rollups_deleted=0, partitions_dropped=0
+        )
+        policies = effective_policies(db)
+
+        if is_partitioned(db):
+            ensure_partitions(db, now)
+            _add("partitions_dropped", drop_expired_partitions(db, policies, now))
+
+        for plant_id, (raw_days, minute_rollup_days) in policies.items():
+            if _stop.is_set():
+                break
+            _set(current_plant_id=plant_id)
+            result = prune_plant(db, plant_id, raw_days, minute_rollup_days, now)
+            _add("raw_rows_deleted", result["raw_rows_deleted"])
+            _add("minute_rollups_deleted", result["minute_rollups_deleted"])
+            _add("plants_processed", 1)
+    except Exception as e:
+        db.rollback()
+        logger.exception("Retention run failed")
+        _set(last_error=str(e))
+    finally:
+        db.close()
+        _set(running=False, current_plant_id=None, last_finished_at=datetime.utcnow())
+        with _lock:
+            _metrics["runs"] += 1
+        _run_lock.release()
+    return metrics()
+
+
+def run_in_background() -> dict:
+    threading.Thread(target=run_retention, name="retention-run", daemon=True).start()
+    return metrics()
+
+
+def _scheduler():
+    while not _stop.wait(RETENTION_INTERVAL_MINUTES * 60):
+        run_retention()
+
+
+def start_scheduler():
+    global _thread
+    if RETENTION_INTERVAL_MINUTES <= 0 or (_thread and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_scheduler, name="retention-scheduler", daemon=True)
+    _thread.start()
+
+
+def stop_scheduler():
+    _stop.set()
+    if _thread:
+        _thread.join(timeout=10)
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command == "partition":
+        session = database.SessionLocal()
+        try:
+            convert_to_partitioned(session)
+            print("sensor_data is partitioned by month")
+        finally:
+            session.close()
+    else:
+        print(run_retention())
@@ -0,0 +1,231 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import database
+import models
+
+logger = logging.getLogger(__name__)
+
+BUCKET_MINUTE = "minute"
+BUCKET_HOUR = "hour"
+BUCKET_DAY = "day"
+BUCKET_SIZES = (BUCKET_MINUTE, BUCKET_HOUR, BUCKET_DAY)
+
+METRICS = (
+    ("moisture", "soil_moisture"),
+    ("temperature", "temperature"),
+    ("light", "light_level"),
+)
+
+
+def bucket_start(timestamp: datetime, bucket_size: str) -> datetime:
+    if bucket_size == BUCKET_MINUTE:
+        return timestamp.replace(second=0, microsecond=0)
+    if bucket_size == BUCKET_HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate_rows(rows) -> dict:
+    """
+    Folds raw sensor rows (dicts with plant_id, timestamp and metric columns)
+    into partial rollups keyed by (plant_id, bucket_size, bucket_start).
+    """
+    buckets = {}
+    for row in rows:
+        for bucket_size in BUCKET_SIZES:
+            key = (row["plant_id"], bucket_size, bucket_start(row["timestamp"], bucket_size))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = {"plant_id": key[0], "bucket_size": key[1], "bucket_start": key[2], "count": 0}
+                for name, column in METRICS:
+                    value = float(row[column])
+                    bucket[f"{name}_sum"] = 0.0
+                    bucket[f"{name}_min"] = value
+                    bucket[f"{name}_max"] = value
+                buckets[key] = bucket
+
+            bucket["count"] += 1
+            for name, column in METRICS:
+                value = float(row[column])
+                bucket[f"{name}_sum"] += value
+                bucket[f"{name}_min"] = min(bucket[f"{name}_min"], value)
+                bucket[f"{name}_max"] = max(bucket[f"{name}_max"], value)
+    return buckets
+
+
+def _upsert_statement(db: Session):
+    table = models.SensorRollup.__table__
+    stmt = database.dialect_insert(db, table)
+
+    excluded = stmt.excluded
+    update = {"count": table.c.count + excluded.count}
+    for name, _ in METRICS:
+        total, low, high = f"{name}_sum", f"{name}_min", f"{name}_max"
+        update[total] = table.c[total] + excluded[total]
+        # CASE instead of LEAST/MIN so the same statement works on SQLite and Postgres
+        update[low] = case((excluded[low] < table.c[low], excluded[low]), else_=table.c[low])
+        update[high] = case((excluded[high] > table.c[high], excluded[high]), else_=table.c[high])
+
+    return stmt.on_conflict_do_update(
+        index_elements=["plant_id", "bucket_size", "bucket_start"],
+        set_=update
+    )
+
+
+def update_rollups(db: Session, rows: list[dict]):
+    """
+    Merges newly ingested rows into the minute/hour/day rollups.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if not rows:
+        return
+    buckets = aggregate_rows(rows)
+    db.execute(_upsert_statement(db), list(buckets.values()))
+
+
+def rebuild_rollups(db: Session, plant_id: int) -> int:
+    """
+    Recomputes the rollups of one plant from raw sensor_data. Returns the number of readings scanned.
+    Only buckets from the first day with raw data onwards are replaced, so rollups of days
+    whose raw rows were already removed by retention are kept.
+    """
+    first, = db.query(func.min(models.SensorData.timestamp)).filter(models.SensorData.plant_id == plant_id).first()
+    if first is None:
+        return 0
+    db.query(models.SensorRollup).filter(
+        models.SensorRollup.plant_id == plant_id,
+        models.SensorRollup.bucket_start >= bucket_start(first, BUCKET_DAY)
+    ).delete(synchronize_session=False)
+
+    readings = db.query(
+        models.SensorData.plant_id,
+        models.SensorData.soil_moisture,
+        models.SensorData.temperature,
+        models.SensorData.light_level,
+        models.SensorData.timestamp
+    ).filter(models.SensorData.plant_id == plant_id)\
+     .order_by(models.SensorData.timestamp.asc()).yield_per(1000)
+
+    # Rows arrive in time order, so buckets are written out one day at a time
+    count = 0
+    day_rows = []
+    current_day = None
+    for reading in readings:
+        day = bucket_start(reading.timestamp, BUCKET_DAY)
+        if day != current_day and day_rows:
+            _insert_buckets(db, aggregate_rows(day_rows))
+            day_rows = []
+        current_day = day
+        day_rows.append(reading._asdict())
+        count += 1
+    _insert_buckets(db, aggregate_rows(day_rows))
+
+    db.commit()
+    return count
+
+
+# Plants whose rollups were found to cover their raw history. Ingest, import and rebuild
+# write raw rows and rollups in the same transaction, so such a plant can't become stale again.
+_verified_plants = set()
+_verified_lock = threading.Lock()
+
+
+def _history_starts(db: Session, plant_ids) -> list[tuple]:
+    """
+    (plant_id, first raw timestamp, first day bucket) per plant, as index lookups.
+    """
+    first_raw = select(func.min(models.SensorData.timestamp)).where(
+        models.SensorData.plant_id == models.Plant.plant_id
+    ).correlate(models.Plant).scalar_subquery()
+    first_bucket = select(func.min(models.SensorRollup.bucket_start)).where(
+        models.SensorRollup.plant_id == models.Plant.plant_id,
+        models.SensorRollup.bucket_size == BUCKET_DAY
+    ).correlate(models.Plant).scalar_subquery()
+    return db.query(models.Plant.plant_id, first_raw, first_bucket).filter(models.Plant.plant_id.in_(plant_ids)).all()
+
+
+def pruned_plants(db: Session, plant_ids) -> list[int]:
+    """
+    Plants whose oldest raw rows were removed by retention: their day rollups start on an
+    earlier day than the remaining raw data (retention cuts at midnight, so this is exact).
+    """
+    if not plant_ids:
+        return []
+    return [
+        plant_id for plant_id, raw_start, rollup_start in _history_starts(db, plant_ids)
+        if rollup_start is not None and (raw_start is None or bucket_start(raw_start, BUCKET_DAY) > rollup_start)
+    ]
+
+
+def stale_plants(db: Session, plant_ids) -> list[int]:
+    """
+    Plants with raw history their rollups don't cover, e.g. data ingested before the rollup
+    table existed. Retention only removes raw rows, the oldest first, so:
+      - raw data starting on a day before the first day bucket is uncovered;
+      - raw data starting on that very day is uncovered if the day holds more raw rows
+        than the bucket counted (rollups first built partway through the day).
+    Costs one query of index lookups plus a one-day count per plant, once per plant and process.
+    """
+    with _verified_lock:
+        candidates = [plant_id for plant_id in plant_ids if plant_id not in _verified_plants]
+    if not candidates:
+        return []
+
+    stale = []
+    verified = []
+    for plant_id, raw_start, rollup_start in _history_starts(db, candidates):
+        if raw_start is None:
+            verified.append(plant_id)
+            continue
+        raw_day = bucket_start(raw_start, BUCKET_DAY)
+        if rollup_start is None or raw_day < rollup_start:
+            stale.append(plant_id)
+        elif raw_day == rollup_start and _raw_rows_uncounted(db, plant_id, raw_day):
+            stale.append(plant_id)
+        else:
+            verified.append(plant_id)
+
+    with _verified_lock:
+        _verified_plants.update(verified)
+    return stale
+
+
+def _raw_rows_uncounted(db: Session, plant_id: int, day: datetime) -> bool:
+    # Raw rows first: rows committed between the two queries can only raise the bucket count
+    raw_count = db.query(func.count(models.SensorData.sensor_data_id)).filter(
+        models.SensorData.plant_id == plant_id,
+        models.SensorData.timestamp >= day,
+        models.SensorData.timestamp < day + timedelta(days=1)
+    ).scalar()
+    bucket_count = db.query(models.SensorRollup.count).filter(
+        models.SensorRollup.plant_id == plant_id,
+        models.SensorRollup.bucket_size == BUCKET_DAY,
+        models.SensorRollup.bucket_start == day
+    ).scalar() or 0
+    return raw_count > bucket_count
+
+
+def ensure_rollups(db: Session, plant_ids):
+    """
+    Rebuilds the rollups of plants with raw history they don't cover yet, so analytics of an
+    upgraded database are right without running rebuild_rollups.py first.
+    """
+    for plant_id in stale_plants(db, plant_ids):
+        logger.info("Building rollups of plant %d from raw sensor data", plant_id)
+        try:
+            rebuild_rollups(db, plant_id)
+        except IntegrityError:
+            # Another worker rebuilt the same plant concurrently
+            db.rollback()
+            continue
+        with _verified_lock:
+            _verified_plants.add(plant_id)
+
+
+def _insert_buckets(db: Session, buckets: dict):
+    if buckets:
+        db.execute(models.SensorRollup.__table__.insert(), list(buckets.values()))
@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
+# Readings per batch request; a longer list fails validation without its items being validated
+MAX_BATCH_SIZE = 5000
+
 
 class SensorDataCreate(BaseModel):
     plant_id: int
@@ -16,6 +19,19 @@ class SensorDataResponse(SensorDataCreate):
     sensor_data_id: int
     timestamp: datetime
 
+class SensorDataBatchCreate(BaseModel):
+    readings: List[SensorDataCreate] = Field(max_length=MAX_BATCH_SIZE)
+
+class SensorDataBatchError(BaseModel):
+    index: int
+    plant_id: int
+    detail: str
+
+class SensorDataBatchResponse(BaseModel):
+    received: int
+    inserted: int
+    errors: List[SensorDataBatchError] = []
+
 class PlantBase(BaseModel):
     name: str
     species: str
@@ -48,3 +64,60 @@ class PlantSettingsResponse(PlantSettingsBase):
     
     class Config:
         from_attributes = True
+
+class RetentionPolicyBase(BaseModel):
+    raw_days: int = 30
+    minute_rollup_days: int = 7
+
+class RetentionPolicyUpdate(RetentionPolicyBase):
+    plant_id: Optional[int] = None
+    raw_days: int = Field(default=30, ge=1)
+    minute_rollup_days: int = Field(default=7, ge=1)
+
+class RetentionPolicyResponse(RetentionPolicyUpdate):
+    policy_id: int
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class AlertResponse(BaseModel):
+    alert_id: int
+    plant_id: int
+    metric: str
+    kind: str
+    status: str
+    threshold: Optional[float] = None
+    value: Optional[float] = None
+    resolved_value: Optional[float] = None
+    opened_at: datetime
+    resolved_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class AnomalyResponse(BaseModel):
+    anomaly_id: int
+    plant_id: int
+    metric: str
+    value: float
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    z_score: Optional[float] = None
+    detected_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class DashboardPlant(BaseModel):
+    plant: PlantResponse
+    settings: Optional[PlantSettingsResponse] = None
+    latest_reading: Optional[SensorDataResponse] = None
+    last_24h: dict
+    forecast: dict
+    health: dict
+
+class UserDashboardResponse(BaseModel):
+    user_id: int
+    full_name: Optional[str] = None
+    plants: List[DashboardPlant]
@@ -1,7 +1,11 @@
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 import models
+import services
+import rollups
+import anomalies
 from datetime import datetime, timedelta
+import math
 import random
 
 models.Base.metadata.create_all(bind=engine)
@@ -90,9 +94,95 @@ def seed_data():
         )
         db.add(reading)
     db.commit()
+    services.rebuild_forecast_state(db, plant.plant_id)
+    rollups.rebuild_rollups(db, plant.plant_id)
+    print(f"Anomalies found in seeded data: {anomalies.rescan_plant(db, plant.plant_id)}")
     print("Realistic sensor data seeded.")
 
     db.close()
 
+SYNTHETIC_PLANT_PREFIX = "Synthetic plant"
+SYNTHETIC_HISTORY_DAYS = 365
+SYNTHETIC_CHUNK_SIZE = 50000
+
+def synthetic_readings(plant_id: int, count: int, end: datetime, days: int = SYNTHETIC_HISTORY_DAYS):
+    """
+    Yields `count` sensor_data rows for one plant, evenly spread over the last `days` days:
+    moisture dries out and is watered back up, temperature and light follow the time of day.
+    """
+    step = timedelta(days=days) / max(count, 1)
+    moisture = random.uniform(50.0, 85.0)
+    for i in range(count):
+        timestamp = end - step * (count - i)
+        moisture -= random.uniform(0.0, 0.5)
+        if moisture < 25:
+            moisture = random.uniform(75.0, 90.0)
+        daylight = max(0.0, math.sin((timestamp.hour + timestamp.minute / 60 - 6) / 12 * math.pi))
+        yield {
+            "plant_id": plant_id,
+            "soil_moisture": int(moisture),
+            "temperature": round(18.0 + 8.0 * daylight + random.uniform(-1.0, 1.0), 1),
+            "light_level": int(100 + 800 * daylight + random.uniform(0, 50)),
+            "timestamp": timestamp
+        }
+
+def seed_synthetic(session: Session, total_rows: int, plant_count: int = 10) -> list[int]:
+    """
+    Creates `plant_count` synthetic plants (with settings) sharing `total_rows` readings.
+    Rows are written in bulk chunks together with their rollups; the forecast state is rebuilt at the end.
+    Returns the plant ids.
+    """
+    user = session.query(models.User).filter(models.User.email == "synthetic@example.com").first()
+    if not user:
+        user = models.User(email="synthetic@example.com", password_hash="hashed_secret", full_name="Synthetic Data")
+        session.add(user)
+        session.commit()
+
+    plants = []
+    for i in range(plant_count):
+        plant = models.Plant(user_id=user.user_id, name=f"{SYNTHETIC_PLANT_PREFIX} {i + 1}", species="Synthetic")
+        session.add(plant)
+        plants.append(plant)
+    session.flush()
+    for plant in plants:
+        session.add(models.PlantSettings(
+            plant_id=plant.plant_id,
+            min_moisture=30, max_moisture=80,
+            min_temperature=18.0, max_temperature=28.0,
+            min_light_level=300
+        ))
+    session.commit()
+    plant_ids = [plant.plant_id for plant in plants]
+
+    end = datetime.utcnow()
+    written = 0
+    for index, plant_id in enumerate(plant_ids):
+        count = total_rows // plant_count + (1 if index < total_rows % plant_count else 0)
+        chunk = []
+        for row in synthetic_readings(plant_id, count, end):
+            chunk.append(row)
+            if len(chunk) >= SYNTHETIC_CHUNK_SIZE:
+                services.copy_sensor_data_rows(session, chunk)
+                rollups.update_rollups(session, chunk)
+                session.commit()
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            services.copy_sensor_data_rows(session, chunk)
+            rollups.update_rollups(session, chunk)
+            session.commit()
+            written += len(chunk)
+        services.rebuild_forecast_state(session, plant_id)
+        print(f"Seeded {written}/{total_rows} synthetic readings")
+
+    return plant_ids
+
 if __name__ == "__main__":
-    seed_data()
+    import sys
+
+    if len(sys.argv) > 2 and sys.argv[1] == "synthetic":
+        # python seed_data.py synthetic <rows> [plants]
+        seed_synthetic(db, int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 10)
+        db.close()
+    else:
+        seed_data()
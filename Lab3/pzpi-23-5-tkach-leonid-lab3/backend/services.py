@@ -1,13 +1,37 @@
-import shutil
 import csv
 import io
+import base64
+import zlib
+import logging
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, extract, or_, and_, case, select
 import models
+import schemas
+import database
+import alerts
+import anomalies
+import cache
+import response_cache
+import rollups
 
+logger = logging.getLogger(__name__)
 
 
+MAX_BATCH_SIZE = schemas.MAX_BATCH_SIZE
+DEFAULT_HISTORY_LIMIT = 1000
+MAX_HISTORY_LIMIT = 10000
+
+
+
+
+
+ALPHA_STABLE = 0.2
+ALPHA_VOLATILE = 0.4
+ALPHA_DEFAULT = 0.5
+VOLATILE_VARIANCE_THRESHOLD = 50
+DEFAULT_TEMPERATURE = 25.0
+MOISTURE_ALERT_LEVEL = 30
 
 
 def calculate_ewma(data: list[float], alpha: float) -> float:
@@ -16,15 +40,18 @@ def calculate_ewma(data: list[float], alpha: float) -> float:
         smoothed = alpha * data[i] + (1 - alpha) * smoothed
     return smoothed
 
+def select_alpha(variance: float) -> float:
+    if variance > VOLATILE_VARIANCE_THRESHOLD:
+        return ALPHA_VOLATILE
+    return ALPHA_STABLE
+
 def get_optimal_alpha(data: list[float]) -> float:
 
     if not data:
-        return 0.5
+        return ALPHA_DEFAULT
     avg = sum(data) / len(data)
     variance = sum((x - avg)**2 for x in data) / len(data)
-    if variance > 50:
-        return 0.4
-    return 0.2
+    return select_alpha(variance)
 
 def weather_correction(base_forecast: float, temp: float) -> float:
 
@@ -34,60 +61,424 @@ def weather_correction(base_forecast: float, temp: float) -> float:
     
     return base_forecast / factor
 
-def forecast_moisture(db: Session, plant_id: int):
+def apply_reading_to_forecast_state(state: models.PlantForecastState, moisture: float, temperature: float):
+    """
+    O(1) update of the forecast state with one reading (EWMA for both alphas + Welford mean/variance).
+    """
+    moisture = float(moisture)
+    count = (state.reading_count or 0) + 1
+    if count == 1:
+        state.ewma_stable = moisture
+        state.ewma_volatile = moisture
+        state.moisture_mean = moisture
+        state.moisture_m2 = 0.0
+    else:
+        state.ewma_stable = ALPHA_STABLE * moisture + (1 - ALPHA_STABLE) * state.ewma_stable
+        state.ewma_volatile = ALPHA_VOLATILE * moisture + (1 - ALPHA_VOLATILE) * state.ewma_volatile
+        delta = moisture - state.moisture_mean
+        state.moisture_mean += delta / count
+        state.moisture_m2 += delta * (moisture - state.moisture_mean)
+
+    state.reading_count = count
+    state.last_moisture = moisture
+    state.last_temperature = float(temperature)
+    state.updated_at = datetime.utcnow()
+
+def apply_ingested_rows(db: Session, rows: list[dict]) -> list[dict]:
+    """
+    Updates all state derived from sensor_data (forecast state, rollups, anomalies, alerts) for newly inserted rows.
+    Runs inside the caller's transaction; the caller commits and then publishes the returned alert events.
+    """
+    update_forecast_state(db, rows)
+    rollups.update_rollups(db, rows)
+    anomalies.detector.evaluate(db, rows)
+    return alerts.engine.evaluate(db, rows)
+
+_ingest_listeners = []
+
+def add_ingest_listener(listener):
+    """
+    Registers a callable that receives every list of committed sensor_data rows (e.g. live push).
+    Listeners run on the ingesting thread and must not block.
+    """
+    if listener not in _ingest_listeners:
+        _ingest_listeners.append(listener)
 
-    readings = db.query(models.SensorData).filter(
+def publish_ingested(rows: list[dict], alert_events: list[dict]):
+    """
+    Post-commit fan-out of an ingest: cached responses of the plants are invalidated,
+    then alert listeners and ingest listeners are notified.
+    """
+    response_cache.bump_plants({row["plant_id"] for row in rows})
+    alerts.publish(alert_events)
+    for listener in list(_ingest_listeners):
+        try:
+            listener(rows)
+        except Exception:
+            logger.exception("Ingest listener %r failed", listener)
+
+def update_forecast_state(db: Session, rows: list[dict]):
+    """
+    Applies newly ingested rows to the per-plant forecast state.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if not rows:
+        return
+    plant_ids = sorted({row["plant_id"] for row in rows})
+    # Create missing state rows first: the write takes the lock before the state is read,
+    # so concurrent writers for the same plant neither collide on insert nor lose updates
+    db.execute(
+        database.dialect_insert(db, models.PlantForecastState.__table__).on_conflict_do_nothing(index_elements=["plant_id"]),
+        [{"plant_id": plant_id, "reading_count": 0} for plant_id in plant_ids]
+    )
+    states = {
+        state.plant_id: state
+        for state in db.query(models.PlantForecastState)
+        .filter(models.PlantForecastState.plant_id.in_(plant_ids))
+        .order_by(models.PlantForecastState.plant_id)
+        .with_for_update()
+        .populate_existing()
+    }
+    for row in rows:
+        apply_reading_to_forecast_state(states[row["plant_id"]], row["soil_moisture"], row["temperature"])
+
+def rebuild_forecast_state(db: Session, plant_id: int) -> models.PlantForecastState:
+    """
+    Recomputes the forecast state of one plant from its full history (ordered by timestamp).
+    """
+    state = db.query(models.PlantForecastState).filter(models.PlantForecastState.plant_id == plant_id).first()
+    if state is None:
+        state = models.PlantForecastState(plant_id=plant_id)
+    state.reading_count = 0
+
+    readings = db.query(models.SensorData.soil_moisture, models.SensorData.temperature).filter(
         models.SensorData.plant_id == plant_id
-    ).order_by(models.SensorData.timestamp.asc()).all()
-    
-    values = [float(d.soil_moisture) for d in readings]
-    temps = [float(d.temperature) for d in readings]
-    
-    if len(values) < 2:
+    ).order_by(models.SensorData.timestamp.asc(), models.SensorData.sensor_data_id.asc()).yield_per(1000)
+
+    for moisture, temperature in readings:
+        apply_reading_to_forecast_state(state, moisture, temperature)
+
+    # Don't persist an empty state for plants without history (or unknown plant ids)
+    if state.reading_count or state in db:
+        db.add(state)
+        db.commit()
+    return state
+
+def forecast_moisture(db: Session, plant_id: int):
+
+    state = db.query(models.PlantForecastState).filter(models.PlantForecastState.plant_id == plant_id).first()
+    if state is None:
+        # History ingested before the state table existed: build it once
+        state = rebuild_forecast_state(db, plant_id)
+    return forecast_from_state(state)
+
+def forecast_from_state(state: models.PlantForecastState) -> dict:
+    if (state.reading_count or 0) < 2:
         return {"error": "Not enough data for forecast"}
 
-    alpha = get_optimal_alpha(values)
-    ewma_val = calculate_ewma(values, alpha)
+    variance = state.moisture_m2 / state.reading_count
+    alpha = select_alpha(variance)
+    ewma_val = state.ewma_volatile if alpha == ALPHA_VOLATILE else state.ewma_stable
     
 
-    current_temp = temps[-1] if temps else 25.0
+    current_temp = state.last_temperature if state.last_temperature is not None else DEFAULT_TEMPERATURE
     corrected_forecast = weather_correction(ewma_val, current_temp)
     
 
-    current = values[-1]
+    current = state.last_moisture
     trend = corrected_forecast - current
     
     return {
         "current_moisture": current,
         "forecast_ewma_corrected": round(corrected_forecast, 2),
         "trend": round(trend, 2),
-        "alert": corrected_forecast < 30
+        "alert": corrected_forecast < MOISTURE_ALERT_LEVEL
     }
 
+def create_plant(db: Session, plant: schemas.PlantCreate) -> models.Plant:
+    db_plant = models.Plant(**plant.dict())
+    db.add(db_plant)
+    db.commit()
+    db.refresh(db_plant)
+    cache.invalidate_plant(db_plant.plant_id)
+    response_cache.bump_plant_list()
+    # Drops answers cached for this id while the plant did not exist yet
+    response_cache.bump_plants([db_plant.plant_id])
+    return db_plant
+
+def list_plants(db: Session, skip: int = 0, limit: int = 100) -> list[models.Plant]:
+    return db.query(models.Plant).offset(skip).limit(limit).all()
+
+def update_plant_settings(db: Session, plant_id: int, settings: schemas.PlantSettingsUpdate) -> models.PlantSettings:
+    db_settings = db.query(models.PlantSettings).filter(models.PlantSettings.plant_id == plant_id).first()
+    if not db_settings:
+        db_settings = models.PlantSettings(plant_id=plant_id)
+        db.add(db_settings)
+    
+    for var, value in settings.dict(exclude_unset=True).items():
+        setattr(db_settings, var, value)
+    
+    db_settings.updated_at = datetime.utcnow()
+    db.add(db_settings)
+    db.commit()
+    db.refresh(db_settings)
+    cache.invalidate_plant(plant_id)
+    response_cache.bump_plants([plant_id])
+    return db_settings
+
+def plant_exists(db: Session, plant_id: int) -> bool:
+    """
+    Cached check that a plant exists (used on every ingested reading).
+    """
+    exists = cache.plant_exists_cache.get(plant_id)
+    if exists is None:
+        exists = db.query(models.Plant.plant_id).filter(models.Plant.plant_id == plant_id).first() is not None
+        cache.plant_exists_cache.set(plant_id, exists)
+    return exists
+
+def get_plant_settings(db: Session, plant_id: int) -> schemas.PlantSettingsResponse:
+    """
+    Cached plant settings; default settings are created on first access.
+    """
+    settings = cache.plant_settings_cache.get(plant_id)
+    if settings is None:
+        db_settings = db.query(models.PlantSettings).filter(models.PlantSettings.plant_id == plant_id).first()
+        if not db_settings:
+            db_settings = models.PlantSettings(plant_id=plant_id)
+            db.add(db_settings)
+            db.commit()
+            db.refresh(db_settings)
+        settings = schemas.PlantSettingsResponse.model_validate(db_settings)
+        cache.plant_settings_cache.set(plant_id, settings)
+    return settings
+
+def build_sensor_data_row(reading: schemas.SensorDataCreate) -> dict:
+    return {
+        "plant_id": reading.plant_id,
+        "soil_moisture": reading.soil_moisture,
+        "temperature": reading.temperature,
+        "light_level": reading.light_level,
+        "timestamp": datetime.utcnow()
+    }
+
+def insert_sensor_data_rows(db: Session, rows: list[dict]):
+    """
+    Writes prepared sensor_data rows with one multi-row insert and a single commit.
+    The generated ids come back through RETURNING, so published rows carry sensor_data_id
+    like single readings do; `rows` itself is left without ids, so it can be retried as is.
+    """
+    if not rows:
+        return
+    table = models.SensorData.__table__
+    try:
+        ids = db.execute(
+            table.insert().returning(table.c.sensor_data_id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        rows = [{**row, "sensor_data_id": sensor_data_id} for row, sensor_data_id in zip(rows, ids)]
+        events = apply_ingested_rows(db, rows)
+        db.commit()
+    except Exception:
+        plant_ids = {row["plant_id"] for row in rows}
+        alerts.engine.forget(plant_ids)
+        anomalies.detector.forget(plant_ids)
+        raise
+    publish_ingested(rows, events)
+
+def save_sensor_reading(db: Session, reading: schemas.SensorDataCreate) -> models.SensorData:
+    """
+    Stores a single reading and updates derived per-plant state in the same transaction.
+    """
+    row = build_sensor_data_row(reading)
+    db_sensor_data = models.SensorData(**row)
+    db.add(db_sensor_data)
+    try:
+        events = apply_ingested_rows(db, [row])
+        db.commit()
+    except Exception:
+        alerts.engine.forget({row["plant_id"]})
+        anomalies.detector.forget({row["plant_id"]})
+        raise
+    db.refresh(db_sensor_data)
+    publish_ingested([{**row, "sensor_data_id": db_sensor_data.sensor_data_id}], events)
+    return db_sensor_data
+
+def ingest_sensor_data_batch(db: Session, readings: list[schemas.SensorDataCreate]) -> dict:
+    """
+    Inserts a batch of readings in one transaction.
+    Plant ids are validated with a single query; unknown plants are reported per row.
+    """
+    plant_ids = {r.plant_id for r in readings}
+    existing_ids = set()
+    if plant_ids:
+        existing_ids = {
+            row[0] for row in db.query(models.Plant.plant_id).filter(models.Plant.plant_id.in_(plant_ids))
+        }
+
+    rows = []
+    errors = []
+    for index, reading in enumerate(readings):
+        if reading.plant_id not in existing_ids:
+            errors.append({"index": index, "plant_id": reading.plant_id, "detail": "Plant not found"})
+            continue
+        rows.append(build_sensor_data_row(reading))
+
+    insert_sensor_data_rows(db, rows)
+
+    return {"received": len(readings), "inserted": len(rows), "errors": errors}
+
+def encode_history_cursor(timestamp: datetime, sensor_data_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{sensor_data_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Raises ValueError for malformed cursors.
+    """
+    try:
+        timestamp, sensor_data_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(sensor_data_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# Columns of schemas.SensorDataResponse, in its field order
+HISTORY_COLUMNS = ("plant_id", "soil_moisture", "temperature", "light_level", "sensor_data_id", "timestamp")
+
+def _history_page(query, plant_id: int, start: datetime, end: datetime, limit: int, cursor: str):
+    query = query.filter(models.SensorData.plant_id == plant_id)
+    if start is not None:
+        query = query.filter(models.SensorData.timestamp >= start)
+    if end is not None:
+        query = query.filter(models.SensorData.timestamp < end)
+    if cursor:
+        after_timestamp, after_id = decode_history_cursor(cursor)
+        query = query.filter(or_(
+            models.SensorData.timestamp > after_timestamp,
+            and_(models.SensorData.timestamp == after_timestamp, models.SensorData.sensor_data_id > after_id)
+        ))
+    return query.order_by(
+        models.SensorData.timestamp.asc(), models.SensorData.sensor_data_id.asc()
+    ).limit(limit + 1)
+
+def get_sensor_history(db: Session, plant_id: int, start: datetime = None, end: datetime = None,
+                       limit: int = DEFAULT_HISTORY_LIMIT, cursor: str = None):
+    """
+    One page of a plant's readings in time order, using keyset pagination on (timestamp, sensor_data_id).
+    Returns (readings, next_cursor); next_cursor is None on the last page.
+    """
+    readings = _history_page(db.query(models.SensorData), plant_id, start, end, limit, cursor).all()
+
+    next_cursor = None
+    if len(readings) > limit:
+        readings = readings[:limit]
+        last = readings[-1]
+        next_cursor = encode_history_cursor(last.timestamp, last.sensor_data_id)
+    return readings, next_cursor
+
+def get_sensor_history_rows(db: Session, plant_id: int, start: datetime = None, end: datetime = None,
+                            limit: int = DEFAULT_HISTORY_LIMIT, cursor: str = None):
+    """
+    Same page as get_sensor_history, as plain HISTORY_COLUMNS tuples selected with core SQL:
+    no ORM objects are built, for responses encoded directly (see encoders).
+    """
+    columns = [getattr(models.SensorData, column) for column in HISTORY_COLUMNS]
+    rows = db.execute(_history_page(select(*columns), plant_id, start, end, limit, cursor)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_history_cursor(last.timestamp, last.sensor_data_id)
+    return rows, next_cursor
+
 def get_average_stats_per_plant(db: Session, plant_id: int):
+    rollups.ensure_rollups(db, [plant_id])
     stats = db.query(
-        func.avg(models.SensorData.soil_moisture),
-        func.avg(models.SensorData.temperature),
-        func.avg(models.SensorData.light_level)
-    ).filter(models.SensorData.plant_id == plant_id).first()
-    
+        func.sum(models.SensorRollup.count),
+        func.sum(models.SensorRollup.moisture_sum),
+        func.sum(models.SensorRollup.temperature_sum),
+        func.sum(models.SensorRollup.light_sum)
+    ).filter(
+        models.SensorRollup.plant_id == plant_id,
+        models.SensorRollup.bucket_size == rollups.BUCKET_DAY
+    ).first()
+
+    count = stats[0] or 0
+    if not count:
+        return {"avg_moisture": 0, "avg_temp": 0, "avg_light": 0}
+
     return {
-        "avg_moisture": round(stats[0] or 0, 1),
-        "avg_temp": round(stats[1] or 0, 1),
-        "avg_light": round(stats[2] or 0, 1)
+        "avg_moisture": round(stats[1] / count, 1),
+        "avg_temp": round(stats[2] / count, 1),
+        "avg_light": round(stats[3] / count, 1)
     }
 
 def get_hourly_sensor_data(db: Session, plant_id: int):
+    rollups.ensure_rollups(db, [plant_id])
 
+    # extract() compiles to strftime on SQLite and EXTRACT on Postgres
+    hour = extract('hour', models.SensorRollup.bucket_start).label('hour')
     results = db.query(
-        func.strftime('%H', models.SensorData.timestamp).label('hour'),
-        func.avg(models.SensorData.temperature)
-    ).filter(models.SensorData.plant_id == plant_id)\
-     .group_by('hour').all()
+        hour,
+        func.sum(models.SensorRollup.temperature_sum) / func.sum(models.SensorRollup.count)
+    ).filter(
+        models.SensorRollup.plant_id == plant_id,
+        models.SensorRollup.bucket_size == rollups.BUCKET_HOUR
+    ).group_by(hour).order_by(hour).all()
     
     return [{"hour": int(r.hour), "avg_temp": round(r[1], 1)} for r in results]
 
 
+HEALTH_STATUS_THRESHOLDS = (
+    (90, "Perfect"),
+    (75, "Good"),
+    (50, "Needs Attention"),
+)
+
+def health_status(score: float) -> str:
+    for threshold, status in HEALTH_STATUS_THRESHOLDS:
+        if score >= threshold:
+            return status
+    return "Critical"
+
+def health_points_query(db: Session, start_date: datetime):
+    """
+    Per-plant (plant_id, readings, good_points) aggregated in SQL.
+    A reading scores 1 when moisture and temperature are both within the plant's settings,
+    0.5 when only one of them is, 0 otherwise.
+    """
+    is_moisture_good = models.SensorData.soil_moisture.between(
+        models.PlantSettings.min_moisture, models.PlantSettings.max_moisture
+    )
+    is_temp_good = models.SensorData.temperature.between(
+        models.PlantSettings.min_temperature, models.PlantSettings.max_temperature
+    )
+    points = case(
+        (and_(is_moisture_good, is_temp_good), 1.0),
+        (or_(is_moisture_good, is_temp_good), 0.5),
+        else_=0.0
+    )
+    return db.query(
+        models.SensorData.plant_id,
+        func.count(models.SensorData.sensor_data_id),
+        func.sum(points)
+    ).join(
+        models.PlantSettings, models.PlantSettings.plant_id == models.SensorData.plant_id
+    ).filter(
+        models.SensorData.timestamp >= start_date
+    ).group_by(models.SensorData.plant_id)
+
+def build_health_result(plant_id: int, total_points: int, good_points: float) -> dict:
+    if not total_points:
+        return {"plant_id": plant_id, "health_index": 0, "status": "No Data"}
+
+    score = round((float(good_points) / total_points) * 100, 2)
+    return {
+        "plant_id": plant_id,
+        "analyzed_readings": total_points,
+        "health_index": score, 
+        "status": health_status(score)
+    }
+
 def calculate_plant_health_index(db: Session, plant_id: int, period_days: int = 7) -> dict:
 
     settings = db.query(models.PlantSettings).filter(models.PlantSettings.plant_id == plant_id).first()
@@ -98,111 +489,318 @@ def calculate_plant_health_index(db: Session, plant_id: int, period_days: int =
     start_date = datetime.now() - timedelta(days=period_days)
     
 
-    readings = db.query(models.SensorData).filter(
-        models.SensorData.plant_id == plant_id,
-        models.SensorData.timestamp >= start_date
-    ).all()
-
-    if not readings:
+    row = health_points_query(db, start_date).filter(models.SensorData.plant_id == plant_id).first()
+    if not row:
         return {"health_index": 0, "status": "No Data"}
 
-    total_points = len(readings)
-    good_points = 0.0
-
-
-    for r in readings:
-        is_moisture_good = settings.min_moisture <= r.soil_moisture <= settings.max_moisture
-        is_temp_good = settings.min_temperature <= r.temperature <= settings.max_temperature
-        
-        if is_moisture_good and is_temp_good:
-            good_points += 1.0
-        elif is_moisture_good or is_temp_good:
-             good_points += 0.5 
+    return build_health_result(plant_id, row[1], row[2])
 
+def calculate_fleet_health_index(db: Session, period_days: int = 7) -> list[dict]:
+    """
+    Health index of every plant in one aggregate query.
+    """
+    start_date = datetime.now() - timedelta(days=period_days)
+    points = {row[0]: (row[1], row[2]) for row in health_points_query(db, start_date)}
 
-    score = round((good_points / total_points) * 100, 2)
-    
-    status = "Critical"
-    if score >= 90:
-        status = "Perfect"
-    elif score >= 75:
-        status = "Good"
-    elif score >= 50:
-        status = "Needs Attention"
-
-    return {
-        "plant_id": plant_id,
-        "analyzed_readings": total_points,
-        "health_index": score, 
-        "status": status
-    }
-
+    plants = db.query(models.Plant.plant_id, models.PlantSettings.setting_id).outerjoin(
+        models.PlantSettings, models.PlantSettings.plant_id == models.Plant.plant_id
+    ).order_by(models.Plant.plant_id)
 
+    results = []
+    for plant_id, setting_id in plants:
+        if setting_id is None:
+            results.append({"plant_id": plant_id, "error": "Settings not found", "health_index": 0, "status": "Unknown"})
+            continue
+        total_points, good_points = points.get(plant_id, (0, 0.0))
+        results.append(build_health_result(plant_id, total_points, good_points))
+    return results
 
-def create_database_backup():
+def get_fleet_health(db: Session, period_days: int = 7) -> list[dict]:
     """
-    Creates a copy of the SQLite database file with a timestamp.
+    Cached fleet health report (see cache.HEALTH_CACHE_TTL).
     """
-    source = "sql_app.db"
-    timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-    destination = f"backups/backup_{timestamp}.db"
-    
+    results = cache.fleet_health_cache.get(period_days)
+    if results is None:
+        results = calculate_fleet_health_index(db, period_days)
+        cache.fleet_health_cache.set(period_days, results)
+    return results
 
-    import os
-    if not os.path.exists("backups"):
-        os.makedirs("backups")
-        
-    try:
-        shutil.copy2(source, destination)
-        return {"status": "success", "file": destination}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+DASHBOARD_HEALTH_DAYS = 7
 
-def export_sensor_data_csv(db: Session) -> str:
+def latest_readings(db: Session, plant_ids: list[int]) -> dict:
+    """
+    Latest reading of each plant in one query: a correlated LIMIT 1 lookup per plant on
+    ix_sensor_data_plant_id_timestamp, so it costs an index probe per plant, not a scan of history.
     """
-    Exports all sensor data to a CSV string.
+    if not plant_ids:
+        return {}
+    latest_id = select(models.SensorData.sensor_data_id).where(
+        models.SensorData.plant_id == models.Plant.plant_id
+    ).order_by(
+        models.SensorData.timestamp.desc(), models.SensorData.sensor_data_id.desc()
+    ).limit(1).correlate(models.Plant).scalar_subquery()
+
+    readings = db.query(models.SensorData).join(
+        models.Plant, models.SensorData.sensor_data_id == latest_id
+    ).filter(models.Plant.plant_id.in_(plant_ids))
+    return {reading.plant_id: reading for reading in readings}
+
+def recent_aggregates(db: Session, plant_ids: list[int], since: datetime) -> dict:
     """
-    data = db.query(models.SensorData).all()
+    Count, averages and ranges per plant since `since` (hour-aligned), from the hourly rollups.
+    """
+    if not plant_ids:
+        return {}
+    rollups.ensure_rollups(db, plant_ids)
+    rows = db.query(
+        models.SensorRollup.plant_id,
+        func.sum(models.SensorRollup.count),
+        func.sum(models.SensorRollup.moisture_sum),
+        func.min(models.SensorRollup.moisture_min),
+        func.max(models.SensorRollup.moisture_max),
+        func.sum(models.SensorRollup.temperature_sum),
+        func.min(models.SensorRollup.temperature_min),
+        func.max(models.SensorRollup.temperature_max),
+        func.sum(models.SensorRollup.light_sum),
+        func.min(models.SensorRollup.light_min),
+        func.max(models.SensorRollup.light_max)
+    ).filter(
+        models.SensorRollup.plant_id.in_(plant_ids),
+        models.SensorRollup.bucket_size == rollups.BUCKET_HOUR,
+        models.SensorRollup.bucket_start >= since
+    ).group_by(models.SensorRollup.plant_id)
+
+    aggregates = {}
+    for plant_id, count, m_sum, m_min, m_max, t_sum, t_min, t_max, l_sum, l_min, l_max in rows:
+        if not count:
+            continue
+        aggregates[plant_id] = {
+            "readings": count,
+            "avg_moisture": round(m_sum / count, 1), "min_moisture": m_min, "max_moisture": m_max,
+            "avg_temp": round(t_sum / count, 1), "min_temp": t_min, "max_temp": t_max,
+            "avg_light": round(l_sum / count, 1), "min_light": l_min, "max_light": l_max
+        }
+    return aggregates
+
+def get_user_dashboard(db: Session, user_id: int):
+    """
+    Everything the dashboard shows for a user's plants (settings, latest reading, last 24 hours,
+    forecast, health) in a fixed number of queries, whatever the number of plants.
+    Returns None if the user does not exist.
+    """
+    user = db.query(models.User).filter(models.User.user_id == user_id).first()
+    if user is None:
+        return None
+
+    plants = db.query(models.Plant).options(joinedload(models.Plant.settings)).filter(
+        models.Plant.user_id == user_id
+    ).order_by(models.Plant.plant_id).all()
+    plant_ids = [plant.plant_id for plant in plants]
+
+    latest = latest_readings(db, plant_ids)
+    since = rollups.bucket_start(datetime.utcnow() - timedelta(hours=24), rollups.BUCKET_HOUR)
+    aggregates = recent_aggregates(db, plant_ids, since)
+    states = {}
+    health_points = {}
+    if plant_ids:
+        states = {
+            state.plant_id: state
+            for state in db.query(models.PlantForecastState).filter(models.PlantForecastState.plant_id.in_(plant_ids))
+        }
+        start_date = datetime.now() - timedelta(days=DASHBOARD_HEALTH_DAYS)
+        health_points = {
+            row[0]: (row[1], row[2])
+            for row in health_points_query(db, start_date).filter(models.SensorData.plant_id.in_(plant_ids))
+        }
+
+    results = []
+    for plant in plants:
+        state = states.get(plant.plant_id)
+        if state is None and plant.plant_id in latest:
+            # History ingested before the state table existed, as in forecast_moisture
+            state = rebuild_forecast_state(db, plant.plant_id)
+
+        if plant.settings is None:
+            health = {"error": "Settings not found", "health_index": 0, "status": "Unknown"}
+        else:
+            total_points, good_points = health_points.get(plant.plant_id, (0, 0.0))
+            health = build_health_result(plant.plant_id, total_points, good_points)
+
+        results.append({
+            "plant": plant,
+            "settings": plant.settings,
+            "latest_reading": latest.get(plant.plant_id),
+            "last_24h": aggregates.get(plant.plant_id, {"readings": 0}),
+            "forecast": forecast_from_state(state) if state is not None else {"error": "Not enough data for forecast"},
+            "health": health
+        })
+
+    return {"user_id": user.user_id, "full_name": user.full_name, "plants": results}
+
+
+
+EXPORT_CHUNK_SIZE = 5000
+CSV_COLUMNS = ["sensor_data_id", "plant_id", "soil_moisture", "temperature", "light_level", "timestamp"]
+
+def iter_sensor_data_csv(db: Session, plant_id: int = None, start: datetime = None, end: datetime = None,
+                         chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yields sensor data as CSV text, one chunk of rows at a time.
+    Rows are streamed from a server-side cursor, so memory use does not depend on table size.
+    """
+    query = db.query(
+        models.SensorData.sensor_data_id,
+        models.SensorData.plant_id,
+        models.SensorData.soil_moisture,
+        models.SensorData.temperature,
+        models.SensorData.light_level,
+        models.SensorData.timestamp
+    )
+    if plant_id is not None:
+        query = query.filter(models.SensorData.plant_id == plant_id)
+    if start is not None:
+        query = query.filter(models.SensorData.timestamp >= start)
+    if end is not None:
+        query = query.filter(models.SensorData.timestamp < end)
+
     output = io.StringIO()
     writer = csv.writer(output)
-    
+    writer.writerow(CSV_COLUMNS)
 
-    writer.writerow(["sensor_data_id", "plant_id", "soil_moisture", "temperature", "light_level", "timestamp"])
-    
+    pending = 0
+    for row in query.order_by(models.SensorData.sensor_data_id).yield_per(chunk_size):
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            pending = 0
 
-    for row in data:
-        writer.writerow([
-            row.sensor_data_id, 
-            row.plant_id, 
-            row.soil_moisture, 
-            row.temperature, 
-            row.light_level, 
-            row.timestamp
-        ])
-        
-    return output.getvalue()
+    yield output.getvalue()
 
-def import_sensor_data_csv(db: Session, csv_content: str):
+def gzip_chunks(chunks):
+    """
+    Compresses a stream of text chunks into a gzip stream.
     """
-    Imports sensor data from a CSV string.
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_IMPORT_ERRORS = 100
+IMPORT_COLUMNS = ["plant_id", "soil_moisture", "temperature", "light_level", "timestamp"]
+
+def parse_import_row(row: dict) -> dict:
+    """
+    Converts one CSV record to a sensor_data row. Raises ValueError/KeyError on bad input.
+    An empty or missing timestamp column means "now".
+    """
+    timestamp = (row.get("timestamp") or "").strip()
+    return {
+        "plant_id": int(row["plant_id"]),
+        "soil_moisture": int(row["soil_moisture"]),
+        "temperature": float(row["temperature"]),
+        "light_level": int(row["light_level"]),
+        "timestamp": datetime.fromisoformat(timestamp) if timestamp else datetime.utcnow()
+    }
+
+def copy_sensor_data_rows(db: Session, rows: list[dict]):
+    """
+    Bulk write of one import chunk: COPY on Postgres (psycopg2), executemany insert elsewhere.
+    """
+    cursor = None
+    if db.bind.dialect.name == "postgresql":
+        cursor = db.connection().connection.cursor()
+
+    if cursor is not None and hasattr(cursor, "copy_expert"):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in IMPORT_COLUMNS])
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY sensor_data ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.close()
+    else:
+        db.execute(models.SensorData.__table__.insert(), rows)
+
+def import_sensor_data_csv(db: Session, csv_file, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Imports sensor data from a CSV text stream, chunk by chunk.
+    Each chunk is validated, bulk-written and committed on its own; rejected rows are
+    reported with their line number (the first MAX_IMPORT_ERRORS of them).
+    A line that is not valid UTF-8 stops the import; chunks committed before it are kept and
+    the report says where it stopped.
     """
-    csv_file = io.StringIO(csv_content)
     reader = csv.DictReader(csv_file)
-    
-    count = 0
-    for row in reader:
 
-        try:
-            sensor_data = models.SensorData(
-                plant_id=int(row["plant_id"]),
-                soil_moisture=int(row["soil_moisture"]),
-                temperature=float(row["temperature"]),
-                light_level=int(row["light_level"]),
-            )
-            db.add(sensor_data)
-            count += 1
-        except Exception:
-            continue
-            
-    db.commit()
-    return {"status": "success", "imported_rows": count}
+    imported = 0
+    failed = 0
+    errors = []
+    plant_ids = set()
+    chunk = []
+
+    def report(line: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append({"line": line, "error": message})
+
+    def flush(chunk_rows: list[tuple[int, dict]]):
+        nonlocal imported
+        chunk_ids = {row["plant_id"] for _, row in chunk_rows}
+        known_ids = {
+            r[0] for r in db.query(models.Plant.plant_id).filter(models.Plant.plant_id.in_(chunk_ids))
+        }
+        rows = []
+        for line, row in chunk_rows:
+            if row["plant_id"] in known_ids:
+                rows.append(row)
+            else:
+                report(line, f"Plant {row['plant_id']} not found")
+        if not rows:
+            return
+
+        copy_sensor_data_rows(db, rows)
+        # Rollups are order-independent and can be merged per chunk
+        rollups.update_rollups(db, rows)
+        db.commit()
+        imported += len(rows)
+        plant_ids.update(row["plant_id"] for row in rows)
+
+    decode_error = None
+    try:
+        for row in reader:
+            try:
+                chunk.append((reader.line_num, parse_import_row(row)))
+            except (KeyError, TypeError, ValueError) as e:
+                report(reader.line_num, f"{type(e).__name__}: {e}")
+                continue
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+    except UnicodeDecodeError as e:
+        # Raised while reading the next line; rows parsed before it are still written
+        decode_error = {
+            "line": reader.line_num + 1,
+            "error": f"File must be UTF-8 encoded CSV: invalid byte at position {e.start} of the line, import stopped"
+        }
+    if chunk:
+        flush(chunk)
+
+    # Imported history may be out of order, so the forecast state is recomputed
+    for plant_id in plant_ids:
+        rebuild_forecast_state(db, plant_id)
+    response_cache.bump_plants(plant_ids)
+
+    if decode_error is not None:
+        errors.append(decode_error)
+    return {
+        "status": "success" if not failed and decode_error is None else "partial",
+        "imported_rows": imported,
+        "failed_rows": failed,
+        "errors": errors
+    }
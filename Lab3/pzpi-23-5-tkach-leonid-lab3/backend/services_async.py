@@ -0,0 +1,78 @@
+# Async counterparts of the services used by main_async.
+# Hot-path lookups are native async queries; the heavier functions reuse the sync implementations
+# through AsyncSession.run_sync, which runs them on the event loop (greenlet, no worker thread)
+# while every database round trip is awaited by the async driver.
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+import services
+import cache
+import alerts
+import anomalies
+
+
+async def plant_exists(db: AsyncSession, plant_id: int) -> bool:
+    exists = cache.plant_exists_cache.get(plant_id)
+    if exists is None:
+        result = await db.execute(select(models.Plant.plant_id).where(models.Plant.plant_id == plant_id))
+        exists = result.first() is not None
+        cache.plant_exists_cache.set(plant_id, exists)
+    return exists
+
+async def get_plant_settings(db: AsyncSession, plant_id: int) -> schemas.PlantSettingsResponse:
+    settings = cache.plant_settings_cache.get(plant_id)
+    if settings is None:
+        settings = await db.run_sync(services.get_plant_settings, plant_id)
+    return settings
+
+async def list_plants(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[models.Plant]:
+    result = await db.execute(select(models.Plant).offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def create_plant(db: AsyncSession, plant: schemas.PlantCreate) -> models.Plant:
+    return await db.run_sync(services.create_plant, plant)
+
+async def update_plant_settings(db: AsyncSession, plant_id: int, settings: schemas.PlantSettingsUpdate) -> models.PlantSettings:
+    return await db.run_sync(services.update_plant_settings, plant_id, settings)
+
+async def save_sensor_reading(db: AsyncSession, reading: schemas.SensorDataCreate) -> models.SensorData:
+    return await db.run_sync(services.save_sensor_reading, reading)
+
+async def ingest_sensor_data_batch(db: AsyncSession, readings: list[schemas.SensorDataCreate]) -> dict:
+    return await db.run_sync(services.ingest_sensor_data_batch, readings)
+
+async def get_sensor_history(db: AsyncSession, plant_id: int, start: datetime = None, end: datetime = None,
+                             limit: int = services.DEFAULT_HISTORY_LIMIT, cursor: str = None):
+    return await db.run_sync(services.get_sensor_history, plant_id, start, end, limit, cursor)
+
+async def get_sensor_history_rows(db: AsyncSession, plant_id: int, start: datetime = None, end: datetime = None,
+                                  limit: int = services.DEFAULT_HISTORY_LIMIT, cursor: str = None):
+    return await db.run_sync(services.get_sensor_history_rows, plant_id, start, end, limit, cursor)
+
+async def forecast_moisture(db: AsyncSession, plant_id: int):
+    return await db.run_sync(services.forecast_moisture, plant_id)
+
+async def get_average_stats_per_plant(db: AsyncSession, plant_id: int):
+    return await db.run_sync(services.get_average_stats_per_plant, plant_id)
+
+async def get_hourly_sensor_data(db: AsyncSession, plant_id: int):
+    return await db.run_sync(services.get_hourly_sensor_data, plant_id)
+
+async def calculate_plant_health_index(db: AsyncSession, plant_id: int, period_days: int = 7) -> dict:
+    return await db.run_sync(services.calculate_plant_health_index, plant_id, period_days)
+
+async def get_fleet_health(db: AsyncSession, period_days: int = 7) -> list[dict]:
+    return await db.run_sync(services.get_fleet_health, period_days)
+
+async def get_user_dashboard(db: AsyncSession, user_id: int):
+    return await db.run_sync(services.get_user_dashboard, user_id)
+
+async def list_alerts(db: AsyncSession, plant_id: int, status: str, limit: int) -> list[models.Alert]:
+    return await db.run_sync(alerts.list_alerts, plant_id, status, limit)
+
+async def list_anomalies(db: AsyncSession, plant_id: int, metric: str = None, start: datetime = None,
+                         end: datetime = None, limit: int = 100) -> list[models.Anomaly]:
+    return await db.run_sync(anomalies.list_anomalies, plant_id, metric, start, end, limit)
@@ -0,0 +1,226 @@
+import os
+import socket
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import metrics
+import services
+import telemetry_protocol as protocol
+
+logger = logging.getLogger(__name__)
+
+# Listeners are off unless a port is set; both may share the same port number
+TELEMETRY_HOST = os.getenv("TELEMETRY_HOST", "0.0.0.0")
+TELEMETRY_TCP_PORT = int(os.getenv("TELEMETRY_TCP_PORT", "0"))
+TELEMETRY_UDP_PORT = int(os.getenv("TELEMETRY_UDP_PORT", "0"))
+# Threads writing decoded frames to the database
+TELEMETRY_WRITERS = int(os.getenv("TELEMETRY_WRITERS", "4"))
+# UDP frames waiting for a writer; datagrams beyond this are dropped and answered with "busy"
+TELEMETRY_MAX_PENDING = int(os.getenv("TELEMETRY_MAX_PENDING", "1000"))
+TELEMETRY_IDLE_TIMEOUT = float(os.getenv("TELEMETRY_IDLE_TIMEOUT", "300"))
+DEFAULT_PORT = 9000
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, listener: "TelemetryListener"):
+        self.listener = listener
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        self.listener._on_datagram(self.transport, data, addr)
+
+
+class TelemetryListener:
+    """
+    Accepts binary telemetry frames (telemetry_protocol) over TCP and UDP. Each frame is stored
+    like a POST /api/sensor/data/batch request, in one transaction, and acknowledged with the
+    number of stored and rejected readings.
+    """
+
+    def __init__(self, host: str, tcp_port: int, udp_port: int, writers: int, max_pending: int):
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.writers = writers
+        self.max_pending = max_pending
+        self.max_records = services.MAX_BATCH_SIZE
+        self._executor = None
+        self._tcp_server = None
+        self._udp_transport = None
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.frames = 0
+        self.readings = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.bad_frames = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.tcp_port or self.udp_port)
+
+    async def start(self):
+        if not self.enabled or self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.writers, thread_name_prefix="telemetry-writer")
+        # Every uvicorn worker binds the ports; the kernel spreads connections and datagrams over them
+        reuse_port = hasattr(socket, "SO_REUSEPORT")
+        if self.tcp_port:
+            self._tcp_server = await asyncio.start_server(
+                self._handle_connection, self.host, self.tcp_port, reuse_port=reuse_port
+            )
+            logger.info("Telemetry TCP listener on %s:%d", self.host, self.tcp_port)
+        if self.udp_port:
+            self._udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(self.host, self.udp_port), reuse_port=reuse_port
+            )
+            logger.info("Telemetry UDP listener on %s:%d", self.host, self.udp_port)
+
+    async def stop(self):
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+            self._tcp_server = None
+        if self._udp_transport is not None:
+            self._udp_transport.close()
+            self._udp_transport = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def store(self, readings: list[protocol.Reading]) -> tuple[int, int, int]:
+        """
+        Runs on a writer thread. Returns (status, inserted, rejected) for the acknowledgement.
+        """
+        metrics.current_route.set("telemetry")
+        db = database.SessionLocal()
+        try:
+            result = services.ingest_sensor_data_batch(db, readings)
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to store a telemetry frame of %d readings", len(readings))
+            with self._lock:
+                self.errors += 1
+            return protocol.STATUS_ERROR, 0, len(readings)
+        finally:
+            db.close()
+
+        rejected = len(result["errors"])
+        with self._lock:
+            self.inserted += result["inserted"]
+            self.rejected += rejected
+        return protocol.STATUS_OK, result["inserted"], rejected
+
+    async def _process(self, readings: list[protocol.Reading]) -> bytes:
+        with self._lock:
+            self.frames += 1
+            self.readings += len(readings)
+        status, inserted, rejected = await asyncio.get_running_loop().run_in_executor(self._executor, self.store, readings)
+        return protocol.encode_ack(status, inserted, rejected)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        with self._lock:
+            self.connections += 1
+        try:
+            while True:
+                try:
+                    header = await asyncio.wait_for(reader.readexactly(protocol.HEADER.size), TELEMETRY_IDLE_TIMEOUT)
+                    count = protocol.read_header(header, self.max_records)
+                    payload = await reader.readexactly(count * protocol.RECORD.size)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                except protocol.ProtocolError:
+                    # The stream can't be resynchronized after a bad header
+                    with self._lock:
+                        self.bad_frames += 1
+                    writer.write(protocol.encode_ack(protocol.STATUS_BAD_FRAME))
+                    await writer.drain()
+                    break
+                writer.write(await self._process(protocol.decode_records(payload)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            with self._lock:
+                self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def _on_datagram(self, transport, data: bytes, addr):
+        try:
+            frames = protocol.decode_frames(data, self.max_records)
+        except protocol.ProtocolError:
+            with self._lock:
+                self.bad_frames += 1
+            transport.sendto(protocol.encode_ack(protocol.STATUS_BAD_FRAME), addr)
+            return
+        for readings in frames:
+            if len(self._tasks) >= self.max_pending:
+                with self._lock:
+                    self.dropped += len(readings)
+                transport.sendto(protocol.encode_ack(protocol.STATUS_BUSY, 0, len(readings)), addr)
+                continue
+            task = asyncio.ensure_future(self._reply_datagram(transport, readings, addr))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _reply_datagram(self, transport, readings: list[protocol.Reading], addr):
+        ack = await self._process(readings)
+        if not transport.is_closing():
+            transport.sendto(ack, addr)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "connections": self.connections,
+                "pending_datagram_frames": len(self._tasks),
+                "frames": self.frames,
+                "readings": self.readings,
+                "inserted": self.inserted,
+                "rejected": self.rejected,
+                "bad_frames": self.bad_frames,
+                "dropped": self.dropped,
+                "errors": self.errors
+            }
+
+
+listener = TelemetryListener(
+    TELEMETRY_HOST, TELEMETRY_TCP_PORT, TELEMETRY_UDP_PORT, TELEMETRY_WRITERS, TELEMETRY_MAX_PENDING
+)
+
+
+async def serve_forever():
+    await listener.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await listener.stop()
+
+
+if __name__ == "__main__":
+    # Standalone listener next to (or instead of) the HTTP API, on port 9000 unless configured
+    logging.basicConfig(level=logging.INFO)
+    import models
+    models.Base.metadata.create_all(bind=database.engine)
+    if not listener.enabled:
+        listener.tcp_port = listener.udp_port = DEFAULT_PORT
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
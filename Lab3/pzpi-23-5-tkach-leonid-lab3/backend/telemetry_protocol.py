@@ -0,0 +1,113 @@
+"""
+Compact binary telemetry format, for devices on constrained links (see telemetry_listener.py).
+
+Frame (network byte order):
+    header  "PT" | version u8 | count u16                         5 bytes
+    record  plant_id u32 | soil_moisture u16 | temperature i16     12 bytes each
+            (tenths of a degree) | light_level u32
+Acknowledgement, one per frame:
+    "PA" | version u8 | status u8 | inserted u16 | rejected u16   8 bytes
+
+A reading is 12 bytes instead of ~80 of JSON. Frames are self-delimiting, so a TCP stream or
+a UDP datagram may carry several of them back to back.
+"""
+import struct
+from typing import NamedTuple
+
+MAGIC = b"PT"
+ACK_MAGIC = b"PA"
+VERSION = 1
+
+HEADER = struct.Struct("!2sBH")
+RECORD = struct.Struct("!IHhI")
+ACK = struct.Struct("!2sBBHH")
+
+STATUS_OK = 0
+STATUS_BAD_FRAME = 1
+STATUS_BUSY = 2
+STATUS_ERROR = 3
+
+MAX_RECORDS = 0xFFFF
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class Reading(NamedTuple):
+    """
+    Decoded record. Has the attributes of schemas.SensorDataCreate, so it goes through the same
+    service functions without building a Pydantic model per reading.
+    """
+    plant_id: int
+    soil_moisture: int
+    temperature: float
+    light_level: int
+
+
+def encode_frame(readings) -> bytes:
+    """
+    Packs readings (objects or dicts with the four fields) into one frame.
+    """
+    if len(readings) > MAX_RECORDS:
+        raise ProtocolError(f"At most {MAX_RECORDS} readings per frame")
+    parts = [HEADER.pack(MAGIC, VERSION, len(readings))]
+    try:
+        for r in readings:
+            if isinstance(r, dict):
+                r = Reading(**r)
+            parts.append(RECORD.pack(r.plant_id, r.soil_moisture, round(r.temperature * 10), r.light_level))
+    except struct.error as e:
+        raise ProtocolError(f"Reading out of range: {e}")
+    return b"".join(parts)
+
+
+def read_header(data: bytes, max_records: int = MAX_RECORDS) -> int:
+    """
+    Validates a frame header and returns the number of records that follow.
+    """
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ProtocolError("Bad magic")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported version {version}")
+    if count > max_records:
+        raise ProtocolError(f"Too many readings in frame ({count}, max {max_records})")
+    return count
+
+
+def decode_records(payload: bytes) -> list[Reading]:
+    return [Reading(p, m, t / 10, l) for p, m, t, l in RECORD.iter_unpack(payload)]
+
+
+def decode_frames(data: bytes, max_records: int = MAX_RECORDS) -> list[list[Reading]]:
+    """
+    Decodes a buffer holding whole frames (a UDP datagram). Raises ProtocolError if it does not.
+    """
+    frames = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < HEADER.size:
+            raise ProtocolError("Truncated header")
+        count = read_header(data[offset:offset + HEADER.size], max_records)
+        start = offset + HEADER.size
+        end = start + count * RECORD.size
+        if end > len(data):
+            raise ProtocolError("Truncated frame")
+        frames.append(decode_records(data[start:end]))
+        offset = end
+    return frames
+
+
+def encode_ack(status: int, inserted: int = 0, rejected: int = 0) -> bytes:
+    return ACK.pack(ACK_MAGIC, VERSION, status, min(inserted, MAX_RECORDS), min(rejected, MAX_RECORDS))
+
+
+def decode_ack(data: bytes) -> tuple[int, int, int]:
+    """
+    Returns (status, inserted, rejected).
+    """
+    magic, version, status, inserted, rejected = ACK.unpack(data)
+    if magic != ACK_MAGIC or version != VERSION:
+        raise ProtocolError("Bad acknowledgement")
+    return status, inserted, rejected
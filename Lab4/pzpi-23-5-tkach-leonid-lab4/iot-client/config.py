@@ -1,4 +1,5 @@
 import os
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,3 +8,19 @@ class Config:
     SERVER_URL = os.getenv("SERVER_URL", "http://localhost:8000")
     DEVICE_ID = int(os.getenv("DEVICE_ID", "1"))
     SEND_INTERVAL = int(os.getenv("SEND_INTERVAL", "5"))
+
+    # Readings are sent in batches once BATCH_SIZE readings are buffered or the oldest is BATCH_MAX_AGE seconds old
+    BATCH_SIZE = int(os.getenv("BATCH_SIZE", "12"))
+    BATCH_MAX_AGE = float(os.getenv("BATCH_MAX_AGE", "60"))
+    COMPRESS_PAYLOADS = os.getenv("COMPRESS_PAYLOADS", "true").lower() in ("1", "true", "yes")
+    REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+
+    # Unsent batches are appended here and replayed in order once the server is reachable again
+    SPOOL_FILE = os.getenv("SPOOL_FILE", "spool.jsonl")
+    BACKOFF_BASE = float(os.getenv("BACKOFF_BASE", "2"))
+    BACKOFF_MAX = float(os.getenv("BACKOFF_MAX", "300"))
+
+    # http: JSON batches to the REST API; tcp / udp: binary frames to the backend's telemetry listener
+    TRANSPORT = os.getenv("TRANSPORT", "http").lower()
+    TELEMETRY_HOST = os.getenv("TELEMETRY_HOST", urlparse(SERVER_URL).hostname or "localhost")
+    TELEMETRY_PORT = int(os.getenv("TELEMETRY_PORT", "9000"))
@@ -0,0 +1,290 @@
+"""
+Load generator: simulates many devices at once on top of generate_sensor_data.
+
+    python loadgen.py --devices 2000 --rate 0.2 --ramp 30 --duration 120
+    python loadgen.py --in-process ../../../Lab3/pzpi-23-5-tkach-leonid-lab3/backend --setup-plants 10 --devices 50 --duration 20
+    python loadgen.py --mode batch --batch-size 50 --json result.json --baseline last.json
+
+Every device sends on a fixed schedule (open loop). Latency is measured from the scheduled send time,
+so a slow server shows up as latency instead of silently lowering the offered load.
+"""
+import argparse
+import asyncio
+import contextlib
+import gzip
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from config import Config
+from main import generate_sensor_data
+
+PERCENTILES = (50, 95, 99)
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = defaultdict(int)
+        self.errors = 0
+
+    def record(self, latency_ms: float, status):
+        self.latencies.append(latency_ms)
+        self.statuses[status] += 1
+        if isinstance(status, str) or status >= 400:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        result = {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items(), key=str)},
+            "max_ms": round(latencies[-1], 2) if latencies else None
+        }
+        for p in PERCENTILES:
+            result[f"p{p}_ms"] = round(percentile(latencies, p), 2) if latencies else None
+        return result
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LoadGenerator:
+
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.stats = defaultdict(EndpointStats)
+        self.readings_sent = 0
+
+    async def request(self, endpoint: str, method: str, url: str, scheduled_at: float, **kwargs):
+        status = "error"
+        try:
+            # wait_for, because in-process requests never hit the transport timeouts
+            response = await asyncio.wait_for(self.client.request(method, url, **kwargs), Config.REQUEST_TIMEOUT)
+            status = response.status_code
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except httpx.HTTPError:
+            pass
+        self.stats[endpoint].record((time.perf_counter() - scheduled_at) * 1000, status)
+
+    async def send_readings(self, plant_id: int, scheduled_at: float):
+        if self.args.mode == "single":
+            await self.request("POST /api/sensor/data", "POST", "/api/sensor/data", scheduled_at,
+                               json=generate_sensor_data(plant_id))
+            self.readings_sent += 1
+            return
+
+        readings = [generate_sensor_data(plant_id) for _ in range(self.args.batch_size)]
+        body = json.dumps({"readings": readings}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.args.compress:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        await self.request("POST /api/sensor/data/batch", "POST", "/api/sensor/data/batch", scheduled_at,
+                           content=body, headers=headers)
+        self.readings_sent += len(readings)
+
+    async def read_dashboard(self, plant_id: int, scheduled_at: float):
+        endpoint, url = random.choice((
+            ("GET /api/plants/{id}/stats", f"/api/plants/{plant_id}/stats?limit=100"),
+            ("GET /api/plants/{id}/analytics/forecast", f"/api/plants/{plant_id}/analytics/forecast"),
+            ("GET /api/plants/{id}/analytics/hourly", f"/api/plants/{plant_id}/analytics/hourly"),
+        ))
+        await self.request(endpoint, "GET", url, scheduled_at)
+
+    async def device(self, index: int, plant_id: int, started: float, stop_at: float):
+        # Devices join evenly over the ramp, each with a random phase so they do not fire in lockstep
+        interval = 1.0 / self.args.rate
+        next_at = started + self.args.ramp * index / self.args.devices + random.uniform(0, interval)
+        pending = set()
+        while next_at < stop_at:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if random.random() < self.args.read_ratio:
+                coro = self.read_dashboard(plant_id, next_at)
+            else:
+                coro = self.send_readings(plant_id, next_at)
+            # Requests are not awaited in line, a slow response must not delay the next scheduled send
+            task = asyncio.ensure_future(coro)
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            next_at += interval
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def run(self, plant_ids: list[int]) -> dict:
+        started = time.perf_counter()
+        stop_at = started + self.args.duration
+        await asyncio.gather(*(
+            self.device(i, plant_ids[i % len(plant_ids)], started, stop_at)
+            for i in range(self.args.devices)
+        ))
+        elapsed = time.perf_counter() - started
+
+        endpoints = {name: stats.summary(elapsed) for name, stats in sorted(self.stats.items())}
+        return {
+            "config": {
+                "devices": self.args.devices,
+                "rate": self.args.rate,
+                "ramp": self.args.ramp,
+                "duration": self.args.duration,
+                "mode": self.args.mode,
+                "batch_size": self.args.batch_size if self.args.mode == "batch" else 1,
+                "read_ratio": self.args.read_ratio,
+                "target": self.args.in_process or self.args.url
+            },
+            "elapsed_s": round(elapsed, 2),
+            "readings_sent": self.readings_sent,
+            "endpoints": endpoints
+        }
+
+
+def load_backend_app(backend_dir: str):
+    """
+    Imports the FastAPI app from the backend directory. Its main.py is loaded under another name
+    because this client has a main.py of its own.
+    """
+    backend_dir = os.path.abspath(backend_dir)
+    sys.path.insert(0, backend_dir)
+    spec = importlib.util.spec_from_file_location("backend_main", os.path.join(backend_dir, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+async def create_plants(client: httpx.AsyncClient, count: int, user_id: int) -> list[int]:
+    plant_ids = []
+    for i in range(count):
+        response = await client.post("/api/plants", json={
+            "name": f"Load test plant {i + 1}",
+            "species": "Load test",
+            "user_id": user_id
+        })
+        response.raise_for_status()
+        plant_ids.append(response.json()["plant_id"])
+    return plant_ids
+
+
+def parse_plant_ids(value: str) -> list[int]:
+    plant_ids = []
+    for part in value.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            plant_ids.extend(range(int(first), int(last) + 1))
+        else:
+            plant_ids.append(int(part))
+    return plant_ids
+
+
+def print_report(report: dict):
+    config = report["config"]
+    print(f"\n{config['devices']} devices x {config['rate']}/s, mode={config['mode']}, "
+          f"{report['elapsed_s']}s, {report['readings_sent']} readings sent to {config['target']}")
+    print(f"{'endpoint':<44}{'reqs':>8}{'rps':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<44}{s['requests']:>8}{s['throughput_rps']:>9}{s['error_rate'] * 100:>7.2f}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+        if s["errors"]:
+            print(f"{'':<44}statuses: {s['statuses']}")
+
+
+def compare_with_baseline(report: dict, baseline_file: str, tolerance: float) -> list[str]:
+    """
+    Returns the regressions against a previous --json report: a p95 or p99 more than `tolerance` slower,
+    or an error rate that went up by more than one percentage point.
+    """
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {previous[key]} -> {current[key]}")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name}: error_rate {previous['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+
+async def main(args) -> int:
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    timeout = httpx.Timeout(Config.REQUEST_TIMEOUT)
+    if args.in_process:
+        app = load_backend_app(args.in_process)
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=timeout)
+    else:
+        app = None
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout)
+
+    async with client:
+        # ASGITransport does not send lifespan events, so the app's startup/shutdown hooks are run here
+        lifespan = app.router.lifespan_context(app) if app is not None else contextlib.nullcontext()
+        async with lifespan:
+            if args.setup_plants:
+                plant_ids = await create_plants(client, args.setup_plants, args.user_id)
+            else:
+                plant_ids = parse_plant_ids(args.plants)
+            report = await LoadGenerator(client, args).run(plant_ids)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        regressions = compare_with_baseline(report, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many IoT devices against the backend")
+    parser.add_argument("--url", default=Config.SERVER_URL, help="server to load (default: SERVER_URL)")
+    parser.add_argument("--in-process", metavar="BACKEND_DIR",
+                        help="drive the FastAPI app in this process instead of over the network")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second per device")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds until all devices are running")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load, ramp included")
+    parser.add_argument("--mode", choices=("single", "batch"), default="single")
+    parser.add_argument("--batch-size", type=int, default=Config.BATCH_SIZE, help="readings per batch request")
+    parser.add_argument("--no-compress", dest="compress", action="store_false", help="send batches uncompressed")
+    parser.add_argument("--read-ratio", type=float, default=0.0,
+                        help="share of requests that read stats/forecast/hourly instead of sending data")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--plants", default=str(Config.DEVICE_ID), help="plant ids to spread devices over, e.g. 1-50")
+    parser.add_argument("--setup-plants", type=int, default=0, help="create this many plants before the run (needed on an empty database)")
+    parser.add_argument("--user-id", type=int, default=1, help="owner of the plants created by --setup-plants")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="previous --json report; exit with 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/p99 slowdown against the baseline")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -1,7 +1,15 @@
 import requests
 import random
 import time
+import json
+import gzip
+from requests.adapters import HTTPAdapter
 from config import Config
+from spool import Spool
+import protocol
+
+class ServerUnavailable(Exception):
+    pass
 
 def generate_sensor_data(plant_id: int):
 
@@ -12,27 +20,126 @@ def generate_sensor_data(plant_id: int):
         "light_level": random.randint(100, 1000)
     }
 
+def create_session() -> requests.Session:
+    """
+    One pooled keep-alive session for the whole run instead of a new connection per reading.
+    """
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    return session
+
+def send_batch(session: requests.Session, batch: list[dict]):
+    """
+    Sends a batch to the server. Returns once the server has answered it (stored or rejected);
+    raises ServerUnavailable when it should be retried later.
+    """
+    url = f"{Config.SERVER_URL}/api/sensor/data/batch"
+    body = json.dumps({"readings": batch}).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if Config.COMPRESS_PAYLOADS:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+
+    try:
+        response = session.post(url, data=body, headers=headers, timeout=Config.REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise ServerUnavailable(str(e))
+
+    if response.status_code == 429 or response.status_code >= 500:
+        raise ServerUnavailable(f"Status: {response.status_code}")
+    if response.status_code != 200:
+        # Retrying a request the server rejected as invalid would never succeed
+        print(f"Batch rejected. Status: {response.status_code}, Response: {response.text}")
+        return
+
+    try:
+        result = response.json()
+    except ValueError:
+        raise ServerUnavailable("Unreadable response to the batch")
+    print(f"Batch sent: {result.get('inserted')}/{len(batch)} readings stored")
+    for error in result.get("errors", []):
+        print(f"Reading rejected: {error}")
+
+def send_batch_binary(sender: protocol.BinarySender, batch: list[dict]):
+    """
+    Sends a batch as one binary frame (TRANSPORT=tcp|udp). Returns once the server has answered it
+    (stored or rejected as a bad frame); raises ServerUnavailable when it should be retried later.
+    """
+    try:
+        status, inserted, rejected = sender.send(batch)
+    except protocol.EncodeError as e:
+        print(f"Batch rejected: {e}")
+        return
+    except protocol.ProtocolError as e:
+        # A garbled or short acknowledgement doesn't tell whether the batch was stored
+        raise ServerUnavailable(str(e))
+    except OSError as e:
+        raise ServerUnavailable(str(e))
+
+    if status == protocol.STATUS_BAD_FRAME:
+        print("Batch rejected. Status: bad frame")
+        return
+    if status != protocol.STATUS_OK:
+        raise ServerUnavailable(f"Status: {protocol.STATUS_NAMES.get(status, status)}")
+    print(f"Batch sent: {inserted}/{len(batch)} readings stored")
+    if rejected:
+        print(f"{rejected} readings rejected (unknown plant)")
+
+def replay_spool(session: requests.Session, spool: Spool, sender: protocol.BinarySender = None):
+    """
+    Sends the spooled batches in order. A batch leaves the spool only after the server has
+    answered it; ServerUnavailable stops the replay and keeps it for the next attempt.
+    """
+    for batch, end_offset in spool.pending():
+        if batch:
+            if sender is not None:
+                send_batch_binary(sender, batch)
+            else:
+                send_batch(session, batch)
+        spool.confirm(end_offset)
+
 def main():
     print(f"Starting IoT Client for Device ID: {Config.DEVICE_ID}")
     print(f"Server URL: {Config.SERVER_URL}")
     print(f"Send Interval: {Config.SEND_INTERVAL} seconds")
+    print(f"Batch: {Config.BATCH_SIZE} readings / {Config.BATCH_MAX_AGE} seconds, spool: {Config.SPOOL_FILE}")
+
+    session = create_session()
+    sender = None
+    if Config.TRANSPORT in ("tcp", "udp"):
+        print(f"Transport: binary {Config.TRANSPORT} to {Config.TELEMETRY_HOST}:{Config.TELEMETRY_PORT}")
+        sender = protocol.BinarySender(Config.TRANSPORT, Config.TELEMETRY_HOST, Config.TELEMETRY_PORT, Config.REQUEST_TIMEOUT)
+    spool = Spool(Config.SPOOL_FILE)
+    batch = []
+    batch_started = None
+    failures = 0
+    retry_at = 0.0
 
     while True:
         try:
             data = generate_sensor_data(Config.DEVICE_ID)
-            
+            if not batch:
+                batch_started = time.monotonic()
+            batch.append(data)
+
+            batch_full = len(batch) >= Config.BATCH_SIZE
+            batch_old = time.monotonic() - batch_started >= Config.BATCH_MAX_AGE
+            if batch_full or batch_old:
+                # Spool first, so readings are always delivered in the order they were taken
+                spool.append(batch)
+                batch = []
+
+            if not spool.is_empty() and time.monotonic() >= retry_at:
+                try:
+                    replay_spool(session, spool, sender)
+                    failures = 0
+                except ServerUnavailable as e:
+                    failures += 1
+                    delay = min(Config.BACKOFF_MAX, Config.BACKOFF_BASE * 2 ** (failures - 1))
+                    retry_at = time.monotonic() + delay
+                    print(f"Error: Could not deliver data ({e}). Retrying in {delay:.0f} seconds, data kept in spool.")
 
-            url = f"{Config.SERVER_URL}/api/sensor/data"
-            
-            response = requests.post(url, json=data)
-            
-            if response.status_code == 200:
-                print(f"Data sent: {data}, Status: {response.status_code}")
-            else:
-                print(f"Failed to send data. Status: {response.status_code}, Response: {response.text}")
-                
-        except requests.exceptions.ConnectionError:
-            print("Error: Could not connect to server. Is the backend running?")
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             
@@ -0,0 +1,105 @@
+"""
+Binary telemetry frames for the backend's TCP/UDP listener (backend/telemetry_protocol.py):
+a 5-byte header and 12 bytes per reading instead of a JSON object per reading.
+"""
+import socket
+import struct
+
+MAGIC = b"PT"
+ACK_MAGIC = b"PA"
+VERSION = 1
+
+HEADER = struct.Struct("!2sBH")
+RECORD = struct.Struct("!IHhI")
+ACK = struct.Struct("!2sBBHH")
+
+STATUS_OK = 0
+STATUS_BAD_FRAME = 1
+STATUS_BUSY = 2
+STATUS_ERROR = 3
+STATUS_NAMES = {STATUS_OK: "ok", STATUS_BAD_FRAME: "bad frame", STATUS_BUSY: "busy", STATUS_ERROR: "error"}
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class EncodeError(ProtocolError):
+    """
+    The batch can't be put into a frame; sending it again would fail the same way.
+    """
+
+
+def encode_frame(batch: list[dict]) -> bytes:
+    parts = [HEADER.pack(MAGIC, VERSION, len(batch))]
+    try:
+        for r in batch:
+            parts.append(RECORD.pack(r["plant_id"], r["soil_moisture"], round(r["temperature"] * 10), r["light_level"]))
+    except struct.error as e:
+        raise EncodeError(f"Reading out of range: {e}")
+    return b"".join(parts)
+
+
+def decode_ack(data: bytes) -> tuple[int, int, int]:
+    """
+    Returns (status, inserted, rejected).
+    """
+    if len(data) != ACK.size:
+        raise ProtocolError("Bad acknowledgement")
+    magic, version, status, inserted, rejected = ACK.unpack(data)
+    if magic != ACK_MAGIC or version != VERSION:
+        raise ProtocolError("Bad acknowledgement")
+    return status, inserted, rejected
+
+
+class BinarySender:
+    """
+    Sends frames over TCP (one kept-open connection) or UDP and waits for the acknowledgement.
+    Socket errors and timeouts are raised as OSError; the caller retries the batch later,
+    so a lost acknowledgement can make the server store a batch twice.
+    """
+
+    def __init__(self, transport: str, host: str, port: int, timeout: float):
+        self.transport = transport
+        self.address = (host, port)
+        self.timeout = timeout
+        self.sock = None
+
+    def _connect(self):
+        if self.transport == "tcp":
+            self.sock = socket.create_connection(self.address, timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.address)
+
+    def send(self, batch: list[dict]) -> tuple[int, int, int]:
+        frame = encode_frame(batch)
+        if self.sock is None:
+            self._connect()
+        try:
+            if self.transport == "tcp":
+                self.sock.sendall(frame)
+                ack = self._recv_exactly(ACK.size)
+            else:
+                self.sock.send(frame)
+                ack = self.sock.recv(ACK.size)
+            return decode_ack(ack)
+        except (OSError, ProtocolError):
+            self.close()
+            raise
+
+    def _recv_exactly(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed by server")
+            data += chunk
+        return data
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
@@ -0,0 +1,73 @@
+import json
+import os
+
+
+class Spool:
+    """
+    Append-only file of unsent batches (one JSON list per line).
+    The byte offset of the first unconfirmed line is kept in a side file, so a restart
+    resumes replay where it stopped; the files are reset once everything was delivered.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, offset: int):
+        tmp_path = f"{self.offset_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+    def append(self, batch: list[dict]):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(batch) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_empty(self) -> bool:
+        try:
+            return os.path.getsize(self.path) <= self._read_offset()
+        except FileNotFoundError:
+            return True
+
+    def pending(self):
+        """
+        Yields (batch, end_offset) for every unconfirmed batch, oldest first.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._read_offset())
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    # Partially written line from a crash: nothing after it is complete
+                    break
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    batch = []
+                yield batch, f.tell()
+
+    def confirm(self, end_offset: int):
+        self._write_offset(end_offset)
+        if self.is_empty():
+            self.reset()
+
+    def reset(self):
+        for path in (self.path, self.offset_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass